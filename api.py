@@ -10,9 +10,10 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse, parse_qs
 import threading
 
-from config import API_HOST, API_PORT, API_KEY_REQUIRED
-from weather import fetch_weather_data
-from decisions import analyze_sleep_conditions, analyze_daytime_conditions
+from config import API_HOST, API_PORT, API_KEY_REQUIRED, LOCATION_KEY, LOCATION_KEYS, BEST_WINDOW_HOURS
+from http_client import get_http_stats
+from weather import fetch_weather_data, fetch_weather_batch, get_circuit_state, get_latency_stats
+from decisions import get_recommendations, ANALYSIS_TYPES
 
 class SandWACHRequestHandler(BaseHTTPRequestHandler):
     """HTTP request handler for SandWACH API"""
@@ -63,25 +64,30 @@ class SandWACHRequestHandler(BaseHTTPRequestHandler):
     def handle_recommendations(self, query):
         """Handle recommendations API endpoint"""
         try:
-            # Get analysis type from query parameters
+            # Get analysis type and location from query parameters
             analysis_type = query.get('type', ['sleep'])[0]
+            location_key = query.get('location', [LOCATION_KEY])[0]
+            if location_key not in LOCATION_KEYS:
+                self.send_json_response(400, {"error": "Unknown location"})
+                return
+            if analysis_type not in ANALYSIS_TYPES:
+                types = ", ".join(f"'{name}'" for name in ANALYSIS_TYPES)
+                self.send_json_response(400, {"error": f"Invalid analysis type. Use one of {types}"})
+                return
+            window_hours = parse_window_hours(query.get('window_hours', [BEST_WINDOW_HOURS])[0])
+            if window_hours is None:
+                self.send_json_response(400, {"error": "window_hours must be a positive integer"})
+                return
 
             # Fetch weather data
-            weather_data = fetch_weather_data()
+            weather_data = fetch_weather_data(location_key=location_key)
             if not weather_data:
                 self.send_json_response(503, {"error": "Weather service unavailable"})
                 return
 
             # Perform analysis
-            if analysis_type == 'sleep':
-                recommendations = analyze_sleep_conditions(weather_data)
-            elif analysis_type == 'day':
-                recommendations = analyze_daytime_conditions(weather_data)
-            else:
-                self.send_json_response(400, {"error": "Invalid analysis type. Use 'sleep' or 'day'"})
-                return
-
-            self.send_json_response(200, recommendations)
+            recommendations = get_recommendations(weather_data, analysis_type, window_hours=window_hours)
+            self.send_json_response(200, add_weather_age(recommendations, weather_data))
 
         except Exception as e:
             print(f"Recommendations error: {e}")
@@ -89,11 +95,15 @@ class SandWACHRequestHandler(BaseHTTPRequestHandler):
 
     def handle_health(self):
         """Handle health check endpoint"""
+        circuits = get_circuit_state()
         health_status = {
-            "status": "healthy",
+            "status": "healthy" if all_circuits_closed(circuits) else "degraded",
             "timestamp": int(time.time()),
             "service": "SandWACH",
-            "version": "1.0.0"
+            "version": "1.0.0",
+            "weather_circuits": circuits,
+            "provider_latency": get_latency_stats(),
+            "http": get_http_stats()
         }
         self.send_json_response(200, health_status)
 
@@ -105,31 +115,49 @@ class SandWACHRequestHandler(BaseHTTPRequestHandler):
 
             response = {"jsonrpc": "2.0", "id": request_data.get('id')}
 
-            if method == "sandwach.get_weather":
-                weather_data = fetch_weather_data()
+            location_key = params.get('location', LOCATION_KEY)
+
+            if location_key not in LOCATION_KEYS:
+                response["error"] = {"code": -32602, "message": "Unknown location"}
+
+            elif method == "sandwach.get_weather":
+                weather_data = fetch_weather_data(location_key=location_key)
                 if weather_data:
                     response["result"] = weather_data
                 else:
                     response["error"] = {"code": -32000, "message": "Weather service unavailable"}
 
+            elif method == "sandwach.get_weather_batch":
+                location_keys = params.get('locations', LOCATION_KEYS)
+                if any(key not in LOCATION_KEYS for key in location_keys):
+                    response["error"] = {"code": -32602, "message": "Unknown location"}
+                else:
+                    response["result"] = fetch_weather_batch(location_keys)
+
+            elif method == "sandwach.get_recommendations" and params.get('type', 'sleep') not in ANALYSIS_TYPES:
+                response["error"] = {"code": -32602, "message": "Invalid analysis type"}
+
+            elif method == "sandwach.get_recommendations" and parse_window_hours(params.get('window_hours', BEST_WINDOW_HOURS)) is None:
+                response["error"] = {"code": -32602, "message": "window_hours must be a positive integer"}
+
             elif method == "sandwach.get_recommendations":
                 analysis_type = params.get('type', 'sleep')
-                weather_data = fetch_weather_data()
+                weather_data = fetch_weather_data(location_key=location_key)
 
                 if weather_data:
-                    if analysis_type == 'sleep':
-                        recommendations = analyze_sleep_conditions(weather_data)
-                    else:
-                        recommendations = analyze_daytime_conditions(weather_data)
-                    response["result"] = recommendations
+                    window_hours = parse_window_hours(params.get('window_hours', BEST_WINDOW_HOURS))
+                    recommendations = get_recommendations(weather_data, analysis_type, window_hours=window_hours)
+                    response["result"] = add_weather_age(recommendations, weather_data)
                 else:
                     response["error"] = {"code": -32000, "message": "Weather service unavailable"}
 
             elif method == "sandwach.get_health":
+                circuits = get_circuit_state()
                 response["result"] = {
-                    "status": "healthy",
+                    "status": "healthy" if all_circuits_closed(circuits) else "degraded",
                     "timestamp": int(time.time()),
-                    "service": "SandWACH"
+                    "service": "SandWACH",
+                    "weather_circuits": circuits
                 }
 
             else:
@@ -162,6 +190,26 @@ class SandWACHRequestHandler(BaseHTTPRequestHandler):
         """Override to use print instead of logging"""
         print(f"[API] {format % args}")
 
+def all_circuits_closed(circuits):
+    """Check whether every weather provider circuit is closed"""
+    return all(circuit["state"] == "closed" for circuit in circuits.values())
+
+def parse_window_hours(value):
+    """Parse a best-window length; returns None unless it is a positive integer"""
+    try:
+        hours = int(value)
+    except (TypeError, ValueError):
+        return None
+    return hours if hours > 0 else None
+
+def add_weather_age(recommendations, weather_data):
+    """Annotate recommendations with the age of the weather data behind them"""
+    return {
+        **recommendations,
+        "weather_age_seconds": weather_data.get("age_seconds", 0),
+        "weather_stale": weather_data.get("stale", False)
+    }
+
 def start_api_server():
     """Start the API server"""
     server_address = (API_HOST, API_PORT)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+SandWACH API Budget
+Tracks daily Accuweather calls in SQLite and plans refreshes so the
+scheduled analyses always have quota left
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db
+from config import (
+    ACCUWEATHER_DAILY_CALL_BUDGET, CALLS_PER_REFRESH, BUDGET_SYNC_SECONDS,
+    EVENING_ANALYSIS_HOUR, MORNING_ANALYSIS_HOUR, LOCATION_KEYS
+)
+
+# Today's count is mirrored in memory so cache checks rarely hit the
+# database; it is re-read every BUDGET_SYNC_SECONDS to pick up calls made by
+# other processes, and replaced by the stored total on every write
+_usage = {"day": None, "calls": 0, "synced_at": 0}
+_usage_lock = threading.Lock()
+
+def _today():
+    """Local date used as the usage key"""
+    return datetime.now().date().isoformat()
+
+def _load_today(day):
+    """Read today's call count from the database"""
+    try:
+        row = db.query_one("SELECT calls FROM api_usage WHERE day = ?", (day,))
+        return row[0] if row else 0
+    except sqlite3.Error as e:
+        print(f"Failed to read API usage: {e}")
+        return 0
+
+def get_calls_today():
+    """Return the number of upstream calls made today, by any process"""
+    day = _today()
+    with _usage_lock:
+        if _usage["day"] != day or time.monotonic() - _usage["synced_at"] >= BUDGET_SYNC_SECONDS:
+            _usage["day"] = day
+            _usage["calls"] = _load_today(day)
+            _usage["synced_at"] = time.monotonic()
+        return _usage["calls"]
+
+def record_api_calls(count=1):
+    """Add upstream calls to today's stored count and refresh the mirror from it"""
+    day = _today()
+
+    def write(conn):
+        conn.execute('''
+            INSERT INTO api_usage (day, calls) VALUES (?, ?)
+            ON CONFLICT(day) DO UPDATE SET calls = calls + excluded.calls
+        ''', (day, count))
+        return conn.execute("SELECT calls FROM api_usage WHERE day = ?", (day,)).fetchone()[0]
+
+    try:
+        calls = db.write(write)
+    except sqlite3.Error as e:
+        print(f"Failed to record API usage: {e}")
+        get_calls_today()
+        with _usage_lock:
+            _usage["calls"] += count
+        return
+
+    with _usage_lock:
+        _usage.update(day=day, calls=calls, synced_at=time.monotonic())
+
+def remaining_analyses_today(now=None):
+    """Count the scheduled analyses still to run before midnight"""
+    now = now or datetime.now()
+    return sum(
+        1 for hour in (EVENING_ANALYSIS_HOUR, MORNING_ANALYSIS_HOUR)
+        if now.hour < hour
+    )
+
+def min_refresh_interval(now=None):
+    """
+    Shortest gap between ad-hoc refreshes the remaining budget allows
+    Calls for the remaining scheduled analyses are reserved first and the
+    rest is spread evenly over what is left of the day.
+    Returns: interval in seconds
+    """
+    now = now or datetime.now()
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds_left = (midnight - now).total_seconds()
+
+    # Each refresh cycle covers every configured location
+    calls_per_cycle = CALLS_PER_REFRESH * len(LOCATION_KEYS)
+    reserved = remaining_analyses_today(now) * calls_per_cycle
+    spare = ACCUWEATHER_DAILY_CALL_BUDGET - get_calls_today() - reserved
+    refreshes_left = spare // calls_per_cycle
+    if refreshes_left <= 0:
+        return seconds_left
+    return seconds_left / refreshes_left
+
+def get_budget_status():
+    """Summary of today's usage for logging and health checks"""
+    calls = get_calls_today()
+    return {
+        "day": _today(),
+        "calls": calls,
+        "budget": ACCUWEATHER_DAILY_CALL_BUDGET,
+        "remaining": max(ACCUWEATHER_DAILY_CALL_BUDGET - calls, 0),
+        "min_refresh_interval_minutes": round(min_refresh_interval() / 60, 1)
+    }
+
+# Test function
+if __name__ == "__main__":
+    print("Testing API budget...")
+    print(get_budget_status())
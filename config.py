@@ -2,6 +2,7 @@
 # Hardcoded values for personal use
 
 import os
+from urllib.parse import urlparse
 
 # Load environment variables from .env file
 def load_env():
@@ -18,18 +19,56 @@ load_env()
 # Accuweather API Configuration
 API_KEY = os.getenv('ACCUWEATHER_API_KEY')  # Load from environment variable
 LOCATION_KEY = "327347"  # Boulder, CO location key
+# All homes served by this process (comma-separated); scheduled
+# notifications cover LOCATION_KEY
+LOCATION_KEYS = [key.strip() for key in os.getenv('LOCATION_KEYS', LOCATION_KEY).split(',') if key.strip()]
+MAX_CONCURRENT_FETCHES = 4  # Locations refreshed in parallel
+LOCATION_CACHE_TTL_DAYS = 90  # Lifetime of resolved coordinate/postal code mappings
+LOCATION_LRU_SIZE = 256  # Resolved mappings kept in memory
 API_BASE_URL = "http://dataservice.accuweather.com"
+ACCUWEATHER_DAILY_CALL_BUDGET = 50  # Free tier limit
+CALLS_PER_REFRESH = 2  # Current conditions + hourly forecast
+BUDGET_SYNC_SECONDS = 30  # Re-read the shared call count (other processes) this often
+
+# Weather providers, tried in order (accuweather, open_meteo, replay)
+WEATHER_PROVIDERS = [name.strip() for name in os.getenv('WEATHER_PROVIDERS', 'accuweather').split(',') if name.strip()]
+OPEN_METEO_BASE_URL = "https://api.open-meteo.com"
+LATITUDE = 40.015  # Boulder, CO
+LONGITUDE = -105.2705
+# Coordinates per location key for coordinate-based providers (Open-Meteo),
+# from "key:lat:lon" entries (comma-separated); LOCATION_KEY uses LATITUDE/LONGITUDE
+LOCATION_COORDINATES = {LOCATION_KEY: (LATITUDE, LONGITUDE)}
+for entry in [entry.strip() for entry in os.getenv('LOCATION_COORDINATES', '').split(',') if entry.strip()]:
+    key, lat, lon = entry.split(':')
+    LOCATION_COORDINATES[key.strip()] = (float(lat), float(lon))
+WEATHER_RECORD_DIR = os.getenv('WEATHER_RECORD_DIR', '')  # Save raw Accuweather responses here
+REPLAY_DIR = os.getenv('WEATHER_REPLAY_DIR', 'replay')  # Recorded responses for the replay provider
+REPLAY_LATENCY_SECONDS = float(os.getenv('WEATHER_REPLAY_LATENCY', '0'))
+
+# Hedged requests: race the next provider once the primary passes its p95
+WEATHER_HEDGING = os.getenv('WEATHER_HEDGING', 'false').lower() == 'true'
+HEDGE_DEFAULT_DELAY_SECONDS = 2  # Used until a provider has enough samples
+HEDGE_MIN_SAMPLES = 20
 
 # Temperature Thresholds (°F)
 HOT_TEMP_THRESHOLD = 75  # Above this, recommend AC
 COLD_TEMP_THRESHOLD = 55  # Below this, recommend heating
 MILD_TEMP_MIN = 60
 MILD_TEMP_MAX = 75
+BEST_WINDOW_HOURS = 3  # Length of the coolest window suggested for ventilation/pre-cooling
+RECOMMENDATION_CACHE_SIZE = 64  # Memoized analyses (location x fetch x type)
 
 # Scheduling
 EVENING_ANALYSIS_HOUR = 20  # 8 PM
 MORNING_ANALYSIS_HOUR = 7   # 7 AM
 CHECK_INTERVAL_MINUTES = 60  # Check every hour
+PREFETCH_RETRIES = 3  # Attempts to warm the cache before each analysis
+PREFETCH_RETRY_DELAY_SECONDS = 60
+# Analysis window time zone, e.g. America/Denver; empty = system local time,
+# which the scheduler, budget day and rollups also use
+TIMEZONE = os.getenv('SANDWACH_TIMEZONE', '')
+SLEEP_WINDOW_HOURS = (22, 6)  # Overnight analysis covers 10 PM - 6 AM local time
+DAY_WINDOW_HOURS = (8, 20)  # Daytime analysis covers 8 AM - 8 PM local time
 
 # API Configuration
 API_HOST = "localhost"
@@ -37,9 +76,17 @@ API_PORT = 8080
 API_KEY_REQUIRED = os.getenv('API_KEY_REQUIRED')  # Load from environment variable
 
 # File Paths
-WEATHER_CACHE_FILE = "weather_cache.json"
+WEATHER_CACHE_BACKEND = os.getenv('WEATHER_CACHE_BACKEND', 'sqlite')  # 'sqlite' or 'file'
+WEATHER_CACHE_FILE = "weather_cache.json"  # Per-location files for the 'file' backend
+WEATHER_HISTORY_RETENTION_DAYS = 30  # Fetch history kept in the weather_cache table
 DATABASE_FILE = "sandwach.db"
 
+# SQLite connection settings (db.py)
+DB_BUSY_TIMEOUT_SECONDS = 30  # Wait this long for another writer's lock
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Bytes of the database file memory-mapped for reads
+DB_CACHE_SIZE_KB = 8192  # Page cache per connection
+DB_STATEMENT_CACHE_SIZE = 128  # Prepared statements kept per connection
+
 # Notification Settings
 NOTIFICATION_TITLE = "SandWACH Climate Control"
 EMAIL_FROM = "sandwach@localhost"
@@ -51,6 +98,25 @@ NTFY_SERVER = os.getenv('NTFY_SERVER', 'https://ntfy.sh')
 NTFY_TOPIC = os.getenv('NTFY_TOPIC', 'sandwach')  # Your ntfy topic
 NTFY_AUTH_TOKEN = os.getenv('NTFY_AUTH_TOKEN', '')  # Optional auth token
 
+# Outbound HTTP (shared pooled client)
+HTTP_POOL_MAXSIZE = 4  # Keep-alive connections per host
+HTTP_DEFAULT_TIMEOUT = 30  # Seconds
+HTTP_HOST_TIMEOUTS = {
+    urlparse(API_BASE_URL).hostname: 30,
+    urlparse(NTFY_SERVER).hostname: 10,
+    urlparse(OPEN_METEO_BASE_URL).hostname: 15,
+}
+HTTP_RETRY_TOTAL = 2  # Retries on connection errors, 429 and 5xx
+HTTP_BACKOFF_BASE = 0.5  # Seconds, doubled per attempt with full jitter
+HTTP_BACKOFF_MAX = 8
+
 # System Settings
 LOG_LEVEL = "INFO"
-CACHE_DURATION_HOURS = 1
+CACHE_DURATION_HOURS = 1  # Upper bound; forecast rollover usually expires sooner
+FORECAST_ROLLOVER_GRACE_MINUTES = 2  # Refresh this long after the first forecast hour starts
+PRE_ANALYSIS_REFRESH_MINUTES = 10  # Prefetch lead time before evening/morning analysis
+CACHE_STALE_WINDOW_HOURS = 3  # Serve expired data this long while refreshing in background
+CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failed fetches before failing fast
+CIRCUIT_PROBE_INTERVAL_SECONDS = 300  # Time between half-open probes while open
+CIRCUIT_PROBE_TIMEOUT_SECONDS = 120  # A probe with no outcome by then is treated as lost
+REFRESH_WAIT_TIMEOUT_SECONDS = 90  # Max wait on another caller's weather refresh
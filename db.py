@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+SandWACH Database Connections
+Per-thread SQLite connections tuned for concurrent use (WAL,
+synchronous=NORMAL, mmap and a larger page cache) and a single writer
+thread that runs write transactions from a queue
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+import setup_db
+from config import (
+    DATABASE_FILE, DB_BUSY_TIMEOUT_SECONDS, DB_MMAP_SIZE,
+    DB_CACHE_SIZE_KB, DB_STATEMENT_CACHE_SIZE
+)
+
+_local = threading.local()
+_write_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+def connect():
+    """
+    Open a new connection with the SandWACH pragmas applied
+    Connections are in autocommit mode; writers open their own
+    transactions (see write()).
+    """
+    db_dir = os.path.dirname(DATABASE_FILE)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+
+    conn = sqlite3.connect(
+        DATABASE_FILE,
+        timeout=DB_BUSY_TIMEOUT_SECONDS,
+        cached_statements=DB_STATEMENT_CACHE_SIZE,
+        isolation_level=None
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL only needs to sync at checkpoints to stay consistent
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    return conn
+
+def get_connection():
+    """
+    Return this thread's connection, opening it (and migrating the schema)
+    on first use
+    Connections stay open so their prepared statement caches are reused.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        setup_db.ensure_schema()
+        conn = connect()
+        _local.conn = conn
+    return conn
+
+def query(sql, params=()):
+    """Run a read on this thread's connection and return all rows"""
+    return get_connection().execute(sql, params).fetchall()
+
+def query_one(sql, params=()):
+    """Run a read on this thread's connection and return the first row"""
+    return get_connection().execute(sql, params).fetchone()
+
+def write(func, wait=True):
+    """
+    Run func(conn) in a write transaction on the writer thread
+    Writes are applied one at a time in submission order, so threads never
+    contend for SQLite's write lock. The transaction is rolled back if func
+    raises.
+    Returns: func's result (re-raising its exception), or a Future if
+    wait is False
+    """
+    if threading.current_thread() is _writer:
+        # Already on the writer thread: run inline instead of deadlocking
+        return _run_write(func)
+
+    future = Future()
+    _start_writer()
+    _write_queue.put((func, future))
+    return future.result() if wait else future
+
+def _start_writer():
+    """Start the writer thread on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="sandwach-db-writer", daemon=True)
+            _writer.start()
+
+def _writer_loop():
+    """Apply queued writes until the process exits"""
+    while True:
+        func, future = _write_queue.get()
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            future.set_result(_run_write(func))
+        except BaseException as e:
+            future.set_exception(e)
+
+def _run_write(func):
+    """Run func(conn) inside BEGIN IMMEDIATE ... COMMIT"""
+    conn = get_connection()
+    if conn.in_transaction:
+        # Nested write from inside another write's func
+        return func(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = func(conn)
+        conn.execute("COMMIT")
+        return result
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+# Test function
+if __name__ == "__main__":
+    print("Testing database connection...")
+    for pragma in ("journal_mode", "synchronous", "mmap_size", "cache_size"):
+        print(f"{pragma}: {query_one(f'PRAGMA {pragma}')[0]}")
+    print(f"Schema version: {setup_db.get_schema_version(get_connection())}")
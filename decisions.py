@@ -4,138 +4,507 @@ SandWACH Decision Engine
 Simple temperature analysis and climate control recommendations
 """
 
+import hashlib
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+
 from config import (
     HOT_TEMP_THRESHOLD, COLD_TEMP_THRESHOLD,
-    MILD_TEMP_MIN, MILD_TEMP_MAX
+    MILD_TEMP_MIN, MILD_TEMP_MAX, RECOMMENDATION_CACHE_SIZE, BEST_WINDOW_HOURS,
+    TIMEZONE, SLEEP_WINDOW_HOURS, DAY_WINDOW_HOURS
 )
 
+# NumPy is optional; batch analysis falls back to a Python loop without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Analysis types as forecast windows and the wording used in reasons.
+# "clock" is a (start hour, end hour) window in local time, found in the
+# forecast by timestamp; otherwise "offset"/"hours" pick forecast entries by
+# position (hours None = the rest of the forecast).
+ANALYSIS_TYPES = {
+    "sleep": {
+        "clock": SLEEP_WINDOW_HOURS,
+        "period": "overnight",
+        "reasons": {
+            "ac": "Overnight high of {max_temp}°F exceeds comfort threshold",
+            "heating": "Overnight low of {min_temp}°F below comfort threshold",
+            "windows": "Average temperature {avg_temp:.1f}°F is comfortable for open windows",
+            "monitor": "Temperatures are moderate, continue monitoring"
+        }
+    },
+    "day": {
+        "clock": DAY_WINDOW_HOURS,
+        "period": "daytime",
+        "reasons": {
+            "ac": "Daytime high of {max_temp}°F requires cooling",
+            "heating": "Daytime low of {min_temp}°F requires heating",
+            "windows": "Average temperature {avg_temp:.1f}°F is comfortable for natural ventilation",
+            "comfortable": "Current conditions are comfortable, no action needed"
+        }
+    },
+    "future": {
+        "offset": 0,
+        "hours": None,
+        "period": "forecast",
+        "reasons": {
+            "ac": "Forecast high of {max_temp}°F will require cooling",
+            "heating": "Forecast low of {min_temp}°F will require heating",
+            "windows": "Average temperature {avg_temp:.1f}°F is comfortable for natural ventilation",
+            "monitor": "No climate control needed over the forecast"
+        }
+    }
+}
+
+# Rules in evaluation order: an action applies when the statistic lies in
+# [low, high] (None = unbounded). Fallback rules only apply when no earlier
+# rule matched.
+RULES = [
+    {"action": "ac", "stat": "max_temp", "low": HOT_TEMP_THRESHOLD, "high": None, "priority": "high"},
+    {"action": "heating", "stat": "min_temp", "low": None, "high": COLD_TEMP_THRESHOLD, "priority": "high"},
+    {"action": "windows", "stat": "avg_temp", "low": MILD_TEMP_MIN, "high": MILD_TEMP_MAX, "priority": "medium",
+     "fallback": True},
+]
+# Low priority action used when no rule matched: the first one the analysis
+# type has a reason for
+DEFAULT_ACTIONS = ("monitor", "comfortable")
+
+# Changes whenever the rules, thresholds or reason wording change, so
+# memoized recommendations from an older configuration are never served
+THRESHOLD_VERSION = hashlib.sha1(
+    json.dumps([RULES, ANALYSIS_TYPES], sort_keys=True).encode()
+).hexdigest()[:12]
+
+# Memoized recommendations keyed by (location, fetched_at, type, version)
+_recommendations = OrderedDict()
+_recommendations_lock = threading.Lock()
+
+# Bit positions of actions in batch results
+ACTION_BITS = {action: 1 << bit for bit, action in enumerate(
+    [rule["action"] for rule in RULES] + list(DEFAULT_ACTIONS)
+)}
+
 def analyze_sleep_conditions(weather_data):
     """
     Analyze overnight temperature forecast for sleeping recommendations
     Returns: dict with recommendations
     """
-    if not weather_data or 'forecast' not in weather_data:
-        return {"error": "No weather data available"}
+    return analyze_conditions(weather_data, "sleep")
 
-    # Get temperatures for next 8 hours (overnight period)
-    overnight_temps = get_forecast_temperatures(weather_data, 8)
+def analyze_daytime_conditions(weather_data):
+    """
+    Analyze daytime temperature forecast for habitation recommendations
+    Returns: dict with recommendations
+    """
+    return analyze_conditions(weather_data, "day")
 
-    if not overnight_temps:
-        return {"error": "No forecast data available"}
+def get_recommendations(weather_data, analysis_type, now=None, window_hours=BEST_WINDOW_HOURS):
+    """
+    Recommendations for a weather snapshot, memoized per snapshot and
+    (for clock windows) per remaining window
+    The returned dict is shared between callers and must not be modified.
+    Returns: dict with recommendations
+    """
+    now = time.time() if now is None else now
+    fetched_at = (weather_data or {}).get('fetched_at')
+    if fetched_at is None or analysis_type not in ANALYSIS_TYPES:
+        return analyze_conditions(weather_data, analysis_type, now, window_hours)
+
+    clock = ANALYSIS_TYPES[analysis_type].get("clock")
+    window_start = resolve_clock_window(clock, now)[0] if clock else None
+    key = (weather_data.get('location'), fetched_at, analysis_type, THRESHOLD_VERSION, window_start, window_hours)
+    with _recommendations_lock:
+        if key in _recommendations:
+            _recommendations.move_to_end(key)
+            return _recommendations[key]
+
+    recommendations = analyze_conditions(weather_data, analysis_type, now, window_hours)
+
+    with _recommendations_lock:
+        _recommendations[key] = recommendations
+        _recommendations.move_to_end(key)
+        while len(_recommendations) > RECOMMENDATION_CACHE_SIZE:
+            _recommendations.popitem(last=False)
+    return recommendations
 
-    # Analyze temperature trends
-    min_temp = min(overnight_temps)
-    max_temp = max(overnight_temps)
-    avg_temp = sum(overnight_temps) / len(overnight_temps)
+def invalidate_recommendations(location_key=None):
+    """Drop memoized recommendations for a location (default: all)"""
+    with _recommendations_lock:
+        if location_key is None:
+            _recommendations.clear()
+            return
+        for key in [key for key in _recommendations if key[0] == location_key]:
+            del _recommendations[key]
 
-    print(f"Sleep analysis - Min: {min_temp}°F, Max: {max_temp}°F, Avg: {avg_temp:.1f}°F")
+def analyze_conditions(weather_data, analysis_type, now=None, window_hours=BEST_WINDOW_HOURS):
+    """
+    Analyze the forecast window registered for an analysis type
+    Returns: dict with recommendations
+    """
+    return analyze_all_conditions(weather_data, (analysis_type,), now, window_hours)[analysis_type]
 
-    recommendations = {
-        "type": "sleep",
-        "temperature_analysis": {
-            "min_temp": min_temp,
-            "max_temp": max_temp,
-            "avg_temp": round(avg_temp, 1)
-        },
-        "actions": []
+def analyze_all_conditions(weather_data, analysis_types=None, now=None, window_hours=BEST_WINDOW_HOURS):
+    """
+    Analyze several analysis types with one pass over the forecast
+    Clock windows are the ones in progress or next to come at now
+    (default: current time). Each result also suggests the best
+    window_hours-long stretch for ventilation or pre-cooling.
+    Returns: dict of analysis type -> recommendations
+    """
+    analysis_types = tuple(analysis_types or ANALYSIS_TYPES)
+    for analysis_type in analysis_types:
+        if analysis_type not in ANALYSIS_TYPES:
+            raise ValueError(f"Unknown analysis type: {analysis_type}")
+
+    if not weather_data or 'forecast' not in weather_data:
+        return {analysis_type: {"error": "No weather data available"} for analysis_type in analysis_types}
+
+    now = time.time() if now is None else now
+    forecast = weather_data['forecast']
+    windows = {
+        analysis_type: locate_window(forecast, ANALYSIS_TYPES[analysis_type], now)
+        for analysis_type in analysis_types
     }
+    all_stats = compute_window_stats(get_forecast_temperatures(weather_data), windows)
+
+    results = {}
+    for analysis_type, stats in all_stats.items():
+        coverage = windows[analysis_type].get("coverage")
+        if stats is None and coverage:
+            period = ANALYSIS_TYPES[analysis_type]["period"]
+            results[analysis_type] = {"error": f"Forecast does not cover the {period} window", "window": coverage}
+        elif stats is None:
+            results[analysis_type] = {"error": "No forecast data available"}
+        else:
+            results[analysis_type] = build_recommendations(analysis_type, stats, coverage)
+            offset, hours = windows[analysis_type]["offset"], windows[analysis_type]["hours"]
+            end = None if hours is None else offset + hours
+            results[analysis_type]["best_windows"] = find_best_windows(forecast[offset:end], window_hours)
+    return results
+
+def find_best_windows(forecast, window_hours):
+    """
+    Best stretches of an hourly forecast for opening windows or pre-cooling
+    Returns: dict with "coolest" (the window_hours-long window with the
+    lowest maximum) and "comfortable" (the longest run inside
+    MILD_TEMP_MIN..MILD_TEMP_MAX); each is None when there is none
+    """
+    temperatures = [hour['temperature'] for hour in forecast]
 
-    # Decision logic
-    if max_temp >= HOT_TEMP_THRESHOLD:
-        recommendations["actions"].append({
-            "action": "ac",
-            "reason": f"Overnight high of {max_temp}°F exceeds comfort threshold",
-            "priority": "high"
-        })
-
-    if min_temp <= COLD_TEMP_THRESHOLD:
-        recommendations["actions"].append({
-            "action": "heating",
-            "reason": f"Overnight low of {min_temp}°F below comfort threshold",
-            "priority": "high"
-        })
-
-    if MILD_TEMP_MIN <= avg_temp <= MILD_TEMP_MAX and not recommendations["actions"]:
-        recommendations["actions"].append({
-            "action": "windows",
-            "reason": f"Average temperature {avg_temp:.1f}°F is comfortable for open windows",
-            "priority": "medium"
-        })
+    coolest = None
+    if window_hours <= len(temperatures):
+        mins, maxes = sliding_window_extremes(temperatures, window_hours)
+        start = min(range(len(maxes)), key=maxes.__getitem__)
+        coolest = _describe_span(forecast, start, window_hours, mins[start], maxes[start])
 
-    # Default recommendation if no specific actions
-    if not recommendations["actions"]:
-        recommendations["actions"].append({
-            "action": "monitor",
-            "reason": f"Temperatures are moderate, continue monitoring",
-            "priority": "low"
-        })
+    comfortable = None
+    start, length, low, high = longest_span_within(temperatures, MILD_TEMP_MIN, MILD_TEMP_MAX)
+    if length:
+        comfortable = _describe_span(forecast, start, length, low, high)
 
-    return recommendations
+    return {"coolest": coolest, "comfortable": comfortable}
 
-def analyze_daytime_conditions(weather_data):
+def sliding_window_extremes(values, k):
     """
-    Analyze daytime temperature forecast for habitation recommendations
-    Returns: dict with recommendations
+    Min and max of every k-long window using monotonic deques, O(n)
+    Returns: (mins, maxes), one entry per window start
     """
-    if not weather_data or 'forecast' not in weather_data:
-        return {"error": "No weather data available"}
+    mins, maxes = [], []
+    min_deque, max_deque = deque(), deque()  # Indices of increasing / decreasing values
+    for index, value in enumerate(values):
+        while min_deque and values[min_deque[-1]] >= value:
+            min_deque.pop()
+        min_deque.append(index)
+        while max_deque and values[max_deque[-1]] <= value:
+            max_deque.pop()
+        max_deque.append(index)
+
+        # Drop the index that just left the window
+        if min_deque[0] <= index - k:
+            min_deque.popleft()
+        if max_deque[0] <= index - k:
+            max_deque.popleft()
+
+        if index >= k - 1:
+            mins.append(values[min_deque[0]])
+            maxes.append(values[max_deque[0]])
+    return mins, maxes
+
+def longest_span_within(values, low, high):
+    """
+    Longest run of consecutive values between low and high, growing a
+    window on the right and shrinking it on the left while its min/max
+    (kept in monotonic deques) fall outside the band, O(n)
+    Returns: (start index, length, min, max); length 0 if no value fits
+    """
+    best = (0, 0, None, None)
+    min_deque, max_deque = deque(), deque()
+    left = 0
+    for right, value in enumerate(values):
+        while min_deque and values[min_deque[-1]] >= value:
+            min_deque.pop()
+        min_deque.append(right)
+        while max_deque and values[max_deque[-1]] <= value:
+            max_deque.pop()
+        max_deque.append(right)
+
+        while left <= right and (values[min_deque[0]] < low or values[max_deque[0]] > high):
+            left += 1
+            if min_deque[0] < left:
+                min_deque.popleft()
+            if max_deque[0] < left:
+                max_deque.popleft()
+            if not min_deque:
+                break
+
+        length = right - left + 1
+        if min_deque and length > best[1]:
+            best = (left, length, values[min_deque[0]], values[max_deque[0]])
+    return best
+
+def _describe_span(forecast, start, length, min_temp, max_temp):
+    """Epoch bounds and temperature range of consecutive forecast hours"""
+    return {
+        "start": forecast[start]['time'],
+        "end": forecast[start + length - 1]['time'] + 3600,
+        "hours": length,
+        "min_temp": min_temp,
+        "max_temp": max_temp
+    }
 
-    # Get temperatures for next 12 hours (daytime period)
-    daytime_temps = get_forecast_temperatures(weather_data, 12)
+def resolve_clock_window(clock, now):
+    """
+    Epoch bounds of the clock window in progress or next to come
+    Windows whose end hour is not after the start hour run past midnight.
+    Local times are resolved in TIMEZONE, so windows spanning a DST change
+    are an hour shorter or longer.
+    Returns: (start, end) epochs; start is moved up to the next full hour
+    when the window is already in progress, since forecasts start there
+    """
+    tz = ZoneInfo(TIMEZONE) if TIMEZONE else None
+    start_hour, end_hour = clock
+    today = datetime.fromtimestamp(now, tz).date()
+    next_hour = (int(now) // 3600 + 1) * 3600
+
+    for day in (today - timedelta(days=1), today, today + timedelta(days=1)):
+        start = datetime.combine(day, dtime(start_hour), tzinfo=tz).timestamp()
+        end_day = day + timedelta(days=1) if end_hour <= start_hour else day
+        end = datetime.combine(end_day, dtime(end_hour), tzinfo=tz).timestamp()
+        if end > next_hour:
+            return max(start, next_hour), end
+    raise ValueError(f"No window found for {clock}")
+
+def locate_window(forecast, window, now):
+    """
+    Find a window's forecast entries by binary search on their sorted times
+    Returns: dict with offset and hours, plus coverage details for clock
+    windows
+    """
+    clock = window.get("clock")
+    if not clock:
+        return window
+
+    start, end = resolve_clock_window(clock, now)
+    first = bisect_left(forecast, start, key=lambda hour: hour['time'])
+    last = bisect_left(forecast, end, key=lambda hour: hour['time'])
+    expected = math.ceil((end - start) / 3600)
+    return {
+        "offset": first,
+        "hours": last - first,
+        "coverage": {
+            "start": int(start),
+            "end": int(end),
+            "timezone": TIMEZONE or "local",
+            "expected_hours": expected,
+            "covered_hours": last - first,
+            "coverage": round((last - first) / expected, 2) if expected else 0
+        }
+    }
 
-    if not daytime_temps:
-        return {"error": "No forecast data available"}
+def compute_window_stats(temperatures, windows):
+    """
+    Min/max/average temperature for each window in a single pass
+    Returns: dict of window name -> stats dict, or None for an empty window
+    """
+    accumulators = {name: [0, None, None, 0] for name in windows}  # count, min, max, sum
+    bounds = [
+        (accumulators[name], window["offset"],
+         len(temperatures) if window["hours"] is None else window["offset"] + window["hours"])
+        for name, window in windows.items()
+    ]
 
-    # Analyze temperature trends
-    min_temp = min(daytime_temps)
-    max_temp = max(daytime_temps)
-    avg_temp = sum(daytime_temps) / len(daytime_temps)
+    for index, temp in enumerate(temperatures):
+        for acc, start, end in bounds:
+            if start <= index < end:
+                acc[0] += 1
+                if acc[1] is None or temp < acc[1]:
+                    acc[1] = temp
+                if acc[2] is None or temp > acc[2]:
+                    acc[2] = temp
+                acc[3] += temp
+
+    return {
+        name: {"min_temp": low, "max_temp": high, "avg_temp": total / count} if count else None
+        for name, (count, low, high, total) in accumulators.items()
+    }
+
+def build_recommendations(analysis_type, stats, coverage=None):
+    """
+    Apply RULES to a window's statistics
+    Returns: dict with recommendations
+    """
+    reasons = ANALYSIS_TYPES[analysis_type]["reasons"]
+    actions = []
+    for rule in RULES:
+        if rule.get("fallback") and actions:
+            continue
+        value = stats[rule["stat"]]
+        if (rule["low"] is None or value >= rule["low"]) and (rule["high"] is None or value <= rule["high"]):
+            actions.append({
+                "action": rule["action"],
+                "reason": reasons[rule["action"]].format(**stats),
+                "priority": rule["priority"]
+            })
 
-    print(f"Daytime analysis - Min: {min_temp}°F, Max: {max_temp}°F, Avg: {avg_temp:.1f}°F")
+    # Default recommendation if no specific actions
+    if not actions:
+        action = next(action for action in DEFAULT_ACTIONS if action in reasons)
+        actions.append({"action": action, "reason": reasons[action], "priority": "low"})
 
     recommendations = {
-        "type": "day",
+        "type": analysis_type,
         "temperature_analysis": {
-            "min_temp": min_temp,
-            "max_temp": max_temp,
-            "avg_temp": round(avg_temp, 1)
+            "min_temp": stats["min_temp"],
+            "max_temp": stats["max_temp"],
+            "avg_temp": round(stats["avg_temp"], 1)
         },
-        "actions": []
+        "actions": actions
     }
+    if coverage:
+        recommendations["window"] = coverage
+    return recommendations
 
-    # Decision logic
-    if max_temp >= HOT_TEMP_THRESHOLD:
-        recommendations["actions"].append({
-            "action": "ac",
-            "reason": f"Daytime high of {max_temp}°F requires cooling",
-            "priority": "high"
-        })
-
-    if min_temp <= COLD_TEMP_THRESHOLD:
-        recommendations["actions"].append({
-            "action": "heating",
-            "reason": f"Daytime low of {min_temp}°F requires heating",
-            "priority": "high"
-        })
-
-    if MILD_TEMP_MIN <= avg_temp <= MILD_TEMP_MAX and not recommendations["actions"]:
-        recommendations["actions"].append({
-            "action": "windows",
-            "reason": f"Average temperature {avg_temp:.1f}°F is comfortable for natural ventilation",
-            "priority": "medium"
-        })
-
-    # Default recommendation if no specific actions
-    if not recommendations["actions"]:
-        recommendations["actions"].append({
-            "action": "comfortable",
-            "reason": f"Current conditions are comfortable, no action needed",
-            "priority": "low"
-        })
+def analyze_batch(temperatures, analysis_type):
+    """
+    Analyze many forecasts at once, e.g. for backtests or many homes
+    temperatures is an entries x hours array; NaN or None marks a missing
+    hour. For clock-window types every column is taken to be inside the
+    window, as built by forecasts_to_matrix(..., analysis_type); otherwise
+    column 0 is the first forecast hour. Uses vectorized NumPy when it is
+    installed.
+    Returns: dict of per-entry sequences: min_temp, max_temp, avg_temp
+    (NaN for an empty window) and actions (bitmask of ACTION_BITS, 0 for an
+    empty window)
+    """
+    if analysis_type not in ANALYSIS_TYPES:
+        raise ValueError(f"Unknown analysis type: {analysis_type}")
+    if np is None:
+        return _analyze_batch_python(temperatures, analysis_type)
+
+    temps = np.asarray(temperatures, dtype=float)
+    if temps.ndim != 2:
+        raise ValueError("temperatures must be a 2-D array (entries x hours)")
+    start, end = _batch_columns(analysis_type)
+    temps = temps[:, start:end]
+
+    present = ~np.isnan(temps)
+    count = present.sum(axis=1)
+    valid = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats = {
+            "min_temp": np.where(valid, np.where(present, temps, np.inf).min(axis=1, initial=np.inf), np.nan),
+            "max_temp": np.where(valid, np.where(present, temps, -np.inf).max(axis=1, initial=-np.inf), np.nan),
+            "avg_temp": np.where(present, temps, 0.0).sum(axis=1) / count
+        }
+
+    # Same rule semantics as build_recommendations, one column at a time
+    actions = np.zeros(len(temps), dtype=np.uint32)
+    for rule in RULES:
+        value = stats[rule["stat"]]
+        matched = valid.copy()
+        if rule["low"] is not None:
+            matched &= value >= rule["low"]
+        if rule["high"] is not None:
+            matched &= value <= rule["high"]
+        if rule.get("fallback"):
+            matched &= actions == 0
+        actions[matched] |= ACTION_BITS[rule["action"]]
+
+    reasons = ANALYSIS_TYPES[analysis_type]["reasons"]
+    default = next(action for action in DEFAULT_ACTIONS if action in reasons)
+    actions[valid & (actions == 0)] = ACTION_BITS[default]
+
+    return {**stats, "actions": actions}
+
+def _analyze_batch_python(temperatures, analysis_type):
+    """analyze_batch without NumPy: the single-forecast engine per entry"""
+    start, end = _batch_columns(analysis_type)
+    results = {"min_temp": [], "max_temp": [], "avg_temp": [], "actions": []}
+    for row in temperatures:
+        # Missing hours stay in place so window offsets line up
+        stats = _window_stats_with_gaps(list(row)[start:end])
+        if stats is None:
+            for key in ("min_temp", "max_temp", "avg_temp"):
+                results[key].append(math.nan)
+            results["actions"].append(0)
+            continue
+        for key in ("min_temp", "max_temp", "avg_temp"):
+            results[key].append(stats[key])
+        actions = build_recommendations(analysis_type, stats)["actions"]
+        results["actions"].append(sum(ACTION_BITS[action["action"]] for action in actions))
+    return results
+
+def _batch_columns(analysis_type):
+    """Matrix columns analyze_batch reads for an analysis type: (start, end)"""
+    window = ANALYSIS_TYPES[analysis_type]
+    if window.get("clock"):
+        return 0, None
+    end = None if window["hours"] is None else window["offset"] + window["hours"]
+    return window["offset"], end
+
+def _window_stats_with_gaps(temps):
+    """Window stats for one row, skipping None/NaN hours"""
+    temps = [temp for temp in temps if temp is not None and not math.isnan(temp)]
+    return compute_window_stats(temps, {"window": {"offset": 0, "hours": None}})["window"]
+
+def forecasts_to_matrix(weather_data_list, analysis_type=None, reference_times=None, hours=None):
+    """
+    Stack forecast temperatures from weather data dicts into an
+    entries x hours matrix for analyze_batch, padding short rows with NaN
+    With a clock-window analysis_type, each row holds only the hours of the
+    window located as analyze_conditions would at that entry's reference
+    time (default: its fetched_at), so batch and single-forecast results
+    agree.
+    Returns: NumPy array, or a list of lists without NumPy
+    """
+    window = ANALYSIS_TYPES[analysis_type] if analysis_type else {}
+    if window.get("clock"):
+        if reference_times is None:
+            reference_times = [weather_data.get('fetched_at', time.time()) for weather_data in weather_data_list]
+        rows = []
+        for weather_data, reference_time in zip(weather_data_list, reference_times):
+            located = locate_window(weather_data.get('forecast') or [], window, reference_time)
+            temps = get_forecast_temperatures(weather_data)
+            rows.append(temps[located["offset"]:located["offset"] + located["hours"]][:hours])
+    else:
+        rows = [get_forecast_temperatures(weather_data, hours) for weather_data in weather_data_list]
+    width = hours if hours is not None else max((len(row) for row in rows), default=0)
+    rows = [row + [math.nan] * (width - len(row)) for row in rows]
+    return np.array(rows, dtype=float).reshape(len(rows), width) if np is not None else rows
 
-    return recommendations
+def decode_actions(mask):
+    """Action names set in a batch result bitmask"""
+    return [action for action, bit in ACTION_BITS.items() if int(mask) & bit]
 
-def get_forecast_temperatures(weather_data, hours_ahead):
+def get_forecast_temperatures(weather_data, hours_ahead=None):
     """Extract forecast temperatures from weather data"""
     if not weather_data or 'forecast' not in weather_data:
         return []
@@ -156,13 +525,14 @@ def format_notification_message(recommendations):
     analysis = recommendations["temperature_analysis"]
     actions = recommendations["actions"]
 
-    if recommendations["type"] == "sleep":
-        period = "overnight"
-    else:
-        period = "daytime"
+    period = ANALYSIS_TYPES[recommendations["type"]]["period"]
 
     message = f"{period.title()} Climate Control\n"
-    message += f"Temps: {analysis['min_temp']}°F - {analysis['max_temp']}°F\n\n"
+    message += f"Temps: {analysis['min_temp']}°F - {analysis['max_temp']}°F\n"
+    window = recommendations.get("window")
+    if window and window["covered_hours"] < window["expected_hours"]:
+        message += f"Forecast covers {window['covered_hours']} of {window['expected_hours']} hours\n"
+    message += "\n"
 
     for action in actions:
         priority_icon = "🔴" if action["priority"] == "high" else "🟡" if action["priority"] == "medium" else "🟢"
@@ -174,14 +544,17 @@ def format_notification_message(recommendations):
 if __name__ == "__main__":
     print("Testing decision engine...")
 
-    # Mock weather data for testing
+    # Mock weather data for testing: 24 hours from the next hour, so every
+    # clock window is covered
+    now = int(time.time())
+    next_hour = (now // 3600 + 1) * 3600
     mock_weather = {
-        "current": {"temperature": 72, "conditions": "Clear", "timestamp": 1234567890},
+        "current": {"temperature": 72, "conditions": "Clear", "timestamp": now},
         "forecast": [
-            {"time": 1234567890 + i*3600, "temperature": 70 + i, "conditions": "Clear", "precipitation_probability": 0}
-            for i in range(12)
+            {"time": next_hour + i*3600, "temperature": 70 + i % 12, "conditions": "Clear", "precipitation_probability": 0}
+            for i in range(24)
         ],
-        "fetched_at": 1234567890
+        "fetched_at": now
     }
 
     print("\n=== Sleep Analysis ===")
@@ -191,3 +564,11 @@ if __name__ == "__main__":
     print("\n=== Daytime Analysis ===")
     day_rec = analyze_daytime_conditions(mock_weather)
     print(format_notification_message(day_rec))
+
+    print("\n=== All Analyses ===")
+    for analysis_type, rec in analyze_all_conditions(mock_weather).items():
+        print(f"{analysis_type}: {[action['action'] for action in rec.get('actions', [])]} {rec.get('window', '')}")
+
+    print("\n=== Batch Analysis ===")
+    batch = analyze_batch(forecasts_to_matrix([mock_weather, {"forecast": []}], "sleep"), "sleep")
+    print([decode_actions(mask) for mask in batch["actions"]])
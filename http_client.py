@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+SandWACH HTTP Client
+Shared pooled session with keep-alive, retries and per-host timeouts
+"""
+
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+
+from config import (
+    HTTP_POOL_MAXSIZE, HTTP_DEFAULT_TIMEOUT, HTTP_HOST_TIMEOUTS,
+    HTTP_RETRY_TOTAL, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+_pools = {}  # Latest connection pool per host, for reuse counters
+
+class TrackingPoolManager(PoolManager):
+    """PoolManager that remembers the pool it hands out for each host"""
+
+    def connection_from_pool_key(self, pool_key, request_context=None):
+        pool = super().connection_from_pool_key(pool_key, request_context=request_context)
+        with _stats_lock:
+            _pools[pool.host] = pool
+        return pool
+
+class TrackingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools are tracked for get_http_stats"""
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager = TrackingPoolManager(num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+def get_session():
+    """Return the shared requests session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            # One pool per host, kept alive between calls
+            adapter = TrackingAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+def get_timeout(url):
+    """Look up the timeout configured for the host of a URL"""
+    host = urlparse(url).hostname
+    return HTTP_HOST_TIMEOUTS.get(host, HTTP_DEFAULT_TIMEOUT)
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, honouring a numeric Retry-After"""
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    ceiling = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+def request(method, url, retries=None, on_attempt=None, **kwargs):
+    """
+    Send a request through the shared session
+    Retries connection errors and 429/5xx responses with jittered backoff.
+    Non-idempotent methods are only retried on 429, which the server
+    rejected without processing. on_attempt, if given, is called before
+    every attempt including retries (e.g. to meter API calls).
+    Returns: requests.Response (the last one if retries are exhausted)
+    """
+    method = method.upper()
+    retries = HTTP_RETRY_TOTAL if retries is None else retries
+    kwargs.setdefault("timeout", get_timeout(url))
+    host = urlparse(url).hostname
+    session = get_session()
+
+    attempt = 0
+    while True:
+        _count(host, "requests")
+        if on_attempt:
+            on_attempt()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _count(host, "errors")
+            if attempt >= retries or method not in IDEMPOTENT_METHODS:
+                raise
+            delay = backoff_delay(attempt)
+        else:
+            retryable = response.status_code == 429 or (
+                response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+            )
+            if not retryable or attempt >= retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            response.close()
+
+        attempt += 1
+        _count(host, "retries")
+        print(f"Retrying {method} {host} in {delay:.1f}s (attempt {attempt}/{retries})")
+        time.sleep(delay)
+
+def get(url, **kwargs):
+    """GET through the shared session"""
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    """POST through the shared session"""
+    return request("POST", url, **kwargs)
+
+def _count(host, key):
+    """Increment a per-host counter"""
+    with _stats_lock:
+        host_stats = _stats.setdefault(host, {"requests": 0, "retries": 0, "errors": 0})
+        host_stats[key] += 1
+
+def get_http_stats():
+    """
+    Per-host request counters plus connection reuse from the pools
+    Returns: dict keyed by host
+    """
+    with _stats_lock:
+        stats = {host: dict(values) for host, values in _stats.items()}
+        pools = dict(_pools)
+
+    for host, pool in pools.items():
+        host_stats = stats.setdefault(host, {"requests": 0, "retries": 0, "errors": 0})
+        host_stats["connections_opened"] = pool.num_connections
+        host_stats["connections_reused"] = max(pool.num_requests - pool.num_connections, 0)
+
+    return stats
+
+# Test function
+if __name__ == "__main__":
+    print("Testing HTTP client...")
+    response = get("https://ntfy.sh/v1/health")
+    print(f"Status: {response.status_code}")
+    get("https://ntfy.sh/v1/health")
+    print(f"Stats: {get_http_stats()}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+SandWACH Location Resolver
+Maps coordinates or postal codes to Accuweather location keys, cached in
+SQLite (long TTL) and an in-memory LRU so each place is looked up once
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import budget
+import db
+import http_client
+from config import (
+    API_KEY, API_BASE_URL,
+    LOCATION_CACHE_TTL_DAYS, LOCATION_LRU_SIZE
+)
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+def resolve_by_position(latitude, longitude):
+    """Resolve latitude/longitude to a location key"""
+    # ~100 m precision, so nearby lookups share one cache entry
+    query = f"{round(float(latitude), 3)},{round(float(longitude), 3)}"
+    return _resolve(f"geo:{query}", "/locations/v1/cities/geoposition/search", query)
+
+def resolve_by_postal_code(postal_code):
+    """Resolve a postal code to a location key"""
+    query = str(postal_code).strip().upper()
+    return _resolve(f"postal:{query}", "/locations/v1/postalcodes/search", query)
+
+def _resolve(cache_key, path, query):
+    """
+    Look up a location key: LRU, then SQLite, then one upstream call
+    Returns: location key string, or None if it could not be resolved
+    """
+    with _lru_lock:
+        if cache_key in _lru:
+            _lru.move_to_end(cache_key)
+            return _lru[cache_key]
+
+    location_key = _load_mapping(cache_key)
+    if location_key is None:
+        location_key, name = _search_upstream(path, query)
+        if location_key is None:
+            return None
+        _save_mapping(cache_key, location_key, name)
+
+    with _lru_lock:
+        _lru[cache_key] = location_key
+        _lru.move_to_end(cache_key)
+        while len(_lru) > LOCATION_LRU_SIZE:
+            _lru.popitem(last=False)
+    return location_key
+
+def _load_mapping(cache_key):
+    """Read a non-expired mapping from the database"""
+    min_resolved_at = int(time.time()) - LOCATION_CACHE_TTL_DAYS * 86400
+    try:
+        row = db.query_one(
+            "SELECT location_key FROM location_keys WHERE query = ? AND resolved_at >= ?",
+            (cache_key, min_resolved_at)
+        )
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"Failed to read location mapping: {e}")
+        return None
+
+def _save_mapping(cache_key, location_key, name):
+    """Store a mapping in the database"""
+    try:
+        db.write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO location_keys (query, location_key, name, resolved_at) VALUES (?, ?, ?, ?)",
+            (cache_key, location_key, name, int(time.time()))
+        ))
+    except sqlite3.Error as e:
+        print(f"Failed to save location mapping: {e}")
+
+def _search_upstream(path, query):
+    """
+    Call an Accuweather locations search endpoint
+    Returns: (location key, place name), or (None, None) on failure
+    """
+    url = f"{API_BASE_URL}{path}"
+    print(f"Resolving location: {query}")
+    try:
+        # Every attempt, retries included, is a metered call
+        response = http_client.get(url, params={"apikey": API_KEY, "q": query},
+                                   on_attempt=budget.record_api_calls)
+        response.raise_for_status()
+        data = response.json()
+    except Exception as e:
+        print(f"Location lookup failed: {e}")
+        return None, None
+
+    # Geoposition search returns an object, postal code search a list
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not data or "Key" not in data:
+        print(f"No location found for {query}")
+        return None, None
+    return data["Key"], data.get("LocalizedName")
+
+# Test function
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 3:
+        print(f"Location key: {resolve_by_position(sys.argv[1], sys.argv[2])}")
+    elif len(sys.argv) == 2:
+        print(f"Location key: {resolve_by_postal_code(sys.argv[1])}")
+    else:
+        print("Usage: python locations.py <latitude> <longitude> | <postal_code>")
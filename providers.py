@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+SandWACH Weather Providers
+Backends that fetch current conditions and hourly forecasts and normalize
+them into the shape used by weather.py:
+
+    current:  {"temperature", "conditions", "humidity", "timestamp"}
+    forecast: [{"time", "temperature", "conditions", "precipitation_probability",
+                "humidity"}]
+
+Each provider is a pair of functions registered in PROVIDERS by name.
+They take a location key and the HTTP validators stored with the cached
+section, and return (section, cache_meta). The section is None when the
+upstream answered 304 Not Modified.
+"""
+
+import json
+import os
+import time
+from email.utils import parsedate_to_datetime
+
+import budget
+import http_client
+from config import (
+    API_KEY, API_BASE_URL, OPEN_METEO_BASE_URL, LOCATION_COORDINATES,
+    WEATHER_RECORD_DIR, REPLAY_DIR, REPLAY_LATENCY_SECONDS
+)
+
+FORECAST_HOURS = 12
+
+# WMO weather interpretation codes used by Open-Meteo
+WMO_CONDITIONS = {
+    0: "Clear", 1: "Mostly clear", 2: "Partly cloudy", 3: "Cloudy",
+    45: "Fog", 48: "Fog",
+    51: "Drizzle", 53: "Drizzle", 55: "Drizzle",
+    56: "Freezing drizzle", 57: "Freezing drizzle",
+    61: "Rain", 63: "Rain", 65: "Heavy rain",
+    66: "Freezing rain", 67: "Freezing rain",
+    71: "Snow", 73: "Snow", 75: "Heavy snow", 77: "Snow grains",
+    80: "Showers", 81: "Showers", 82: "Heavy showers",
+    85: "Snow showers", 86: "Snow showers",
+    95: "Thunderstorms", 96: "Thunderstorms", 99: "Thunderstorms"
+}
+
+# Accuweather
+
+def accuweather_current(location_key, validators=None):
+    """Fetch current conditions from Accuweather"""
+    url = f"{API_BASE_URL}/currentconditions/v1/{location_key}"
+    raw, meta = _accuweather_get(url, validators)
+    if raw is None:
+        return None, meta
+    record_response("current", raw)
+    return parse_accuweather_current(raw), meta
+
+def accuweather_forecast(location_key, validators=None):
+    """Fetch the 12 hour forecast from Accuweather"""
+    url = f"{API_BASE_URL}/forecasts/v1/hourly/12hour/{location_key}"
+    raw, meta = _accuweather_get(url, validators)
+    if raw is None:
+        return None, meta
+    record_response("forecast", raw)
+    return parse_accuweather_forecast(raw), meta
+
+def _accuweather_get(url, validators):
+    """GET an Accuweather endpoint, counting every attempt against the daily budget"""
+    params = {"apikey": API_KEY, "details": "true"}
+    return conditional_get(url, params, validators, on_attempt=budget.record_api_calls)
+
+def parse_accuweather_current(raw):
+    """Normalize a currentconditions response"""
+    current_data = raw[0]
+    return {
+        "temperature": current_data["Temperature"]["Imperial"]["Value"],
+        "conditions": current_data["WeatherText"],
+        "humidity": current_data.get("RelativeHumidity", 0),
+        "timestamp": current_data["EpochTime"]
+    }
+
+def parse_accuweather_forecast(raw):
+    """Normalize an hourly forecast response"""
+    return [
+        {
+            "time": hour["EpochDateTime"],
+            "temperature": hour["Temperature"]["Value"],
+            "conditions": hour["IconPhrase"],
+            "precipitation_probability": hour.get("PrecipitationProbability", 0),
+            "humidity": hour.get("RelativeHumidity")
+        }
+        for hour in raw
+    ]
+
+def record_response(name, raw):
+    """Save a raw Accuweather response for the replay provider"""
+    if not WEATHER_RECORD_DIR:
+        return
+    try:
+        os.makedirs(WEATHER_RECORD_DIR, exist_ok=True)
+        with open(os.path.join(WEATHER_RECORD_DIR, f"{name}.json"), 'w') as f:
+            json.dump(raw, f)
+    except OSError as e:
+        print(f"Failed to record {name} response: {e}")
+
+# Conditional GET helpers
+
+def conditional_get(url, params, validators=None, on_attempt=None):
+    """
+    GET with If-None-Match/If-Modified-Since from stored validators
+    Returns: (parsed JSON or None on 304, cache_meta for the response)
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    print(f"Requesting: {url}")
+    response = http_client.get(url, params=params, headers=headers, on_attempt=on_attempt)
+    print(f"Response Status: {response.status_code}")
+
+    if response.status_code == 304:
+        # Keep validators the server did not resend
+        meta = {**(validators or {}), **cache_meta(response)}
+        return None, {key: value for key, value in meta.items() if value is not None}
+
+    response.raise_for_status()
+    return response.json(), cache_meta(response)
+
+def cache_meta(response):
+    """Extract ETag, Last-Modified and freshness lifetime from a response"""
+    meta = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "max_age": parse_max_age(response.headers)
+    }
+    return {key: value for key, value in meta.items() if value is not None}
+
+def parse_max_age(headers):
+    """
+    Freshness lifetime in seconds from Cache-Control (or Expires)
+    Returns: seconds, 0 for no-cache/no-store, or None if not given
+    """
+    cache_control = headers.get("Cache-Control", "")
+    for directive in cache_control.split(","):
+        directive = directive.strip().lower()
+        if directive in ("no-cache", "no-store"):
+            return 0
+        if directive.startswith("max-age="):
+            try:
+                return max(int(directive.split("=", 1)[1]), 0)
+            except ValueError:
+                pass
+
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return max(int(parsedate_to_datetime(expires).timestamp() - time.time()), 0)
+        except (TypeError, ValueError):
+            return 0
+    return None
+
+# Open-Meteo (no API key, located by LOCATION_COORDINATES)
+
+def open_meteo_current(location_key, validators=None):
+    """Fetch current conditions from Open-Meteo"""
+    raw, meta = _open_meteo_get(location_key, {"current": "temperature_2m,relative_humidity_2m,weather_code"}, validators)
+    if raw is None:
+        return None, meta
+    current_data = raw["current"]
+    return {
+        "temperature": current_data["temperature_2m"],
+        "conditions": WMO_CONDITIONS.get(current_data["weather_code"], "Unknown"),
+        "humidity": current_data.get("relative_humidity_2m", 0),
+        "timestamp": current_data["time"]
+    }, meta
+
+def open_meteo_forecast(location_key, validators=None):
+    """Fetch the hourly forecast from Open-Meteo, starting at the next hour"""
+    raw, meta = _open_meteo_get(location_key, {
+        "hourly": "temperature_2m,weather_code,precipitation_probability,relative_humidity_2m",
+        "forecast_hours": FORECAST_HOURS + 1
+    }, validators)
+    if raw is None:
+        return None, meta
+    hourly = raw["hourly"]
+    now = time.time()
+    forecast = [
+        {
+            "time": epoch,
+            "temperature": temperature,
+            "conditions": WMO_CONDITIONS.get(code, "Unknown"),
+            "precipitation_probability": precip or 0,
+            "humidity": humidity
+        }
+        for epoch, temperature, code, precip, humidity in zip(
+            hourly["time"], hourly["temperature_2m"], hourly["weather_code"],
+            hourly["precipitation_probability"], hourly["relative_humidity_2m"]
+        )
+        if epoch > now
+    ]
+    return forecast[:FORECAST_HOURS], meta
+
+def _open_meteo_get(location_key, params, validators):
+    """GET the Open-Meteo forecast endpoint for a location's coordinates"""
+    if location_key not in LOCATION_COORDINATES:
+        raise ValueError(f"No coordinates configured for location {location_key}")
+    latitude, longitude = LOCATION_COORDINATES[location_key]
+    url = f"{OPEN_METEO_BASE_URL}/v1/forecast"
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "temperature_unit": "fahrenheit",
+        "timeformat": "unixtime",
+        **params
+    }
+    return conditional_get(url, params, validators)
+
+# Replay (recorded Accuweather responses from REPLAY_DIR)
+
+def replay_current(location_key, validators=None):
+    """Serve recorded current conditions after REPLAY_LATENCY_SECONDS"""
+    time.sleep(REPLAY_LATENCY_SECONDS)
+    current = parse_accuweather_current(_load_recording("current"))
+    return {**current, "timestamp": int(time.time())}, {}
+
+def replay_forecast(location_key, validators=None):
+    """Serve the recorded forecast, shifted so it starts at the next hour"""
+    time.sleep(REPLAY_LATENCY_SECONDS)
+    forecast = parse_accuweather_forecast(_load_recording("forecast"))
+    if not forecast:
+        return forecast, {}
+    next_hour = (int(time.time()) // 3600 + 1) * 3600
+    offset = next_hour - forecast[0]["time"]
+    return [{**hour, "time": hour["time"] + offset} for hour in forecast], {}
+
+def _load_recording(name):
+    """Load a recorded raw response"""
+    with open(os.path.join(REPLAY_DIR, f"{name}.json")) as f:
+        return json.load(f)
+
+# needs_coordinates: the provider locates by LOCATION_COORDINATES rather
+# than the location key, so it can only serve locations listed there
+PROVIDERS = {
+    "accuweather": {"current": accuweather_current, "forecast": accuweather_forecast},
+    "open_meteo": {"current": open_meteo_current, "forecast": open_meteo_forecast, "needs_coordinates": True},
+    "replay": {"current": replay_current, "forecast": replay_forecast}
+}
+
+def get_provider(name):
+    """Look up a provider by name"""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown weather provider: {name}")
+    return PROVIDERS[name]
+
+def supports_location(name, location_key):
+    """Check whether a provider can serve a location"""
+    return not get_provider(name).get("needs_coordinates") or location_key in LOCATION_COORDINATES
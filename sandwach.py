@@ -7,16 +7,18 @@ Scheduling loop and notification system
 import time
 import subprocess
 import threading
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from config import (
     EVENING_ANALYSIS_HOUR, MORNING_ANALYSIS_HOUR,
     CHECK_INTERVAL_MINUTES, NOTIFICATION_TITLE,
+    PRE_ANALYSIS_REFRESH_MINUTES, PREFETCH_RETRIES, PREFETCH_RETRY_DELAY_SECONDS,
     NTFY_ENABLED, NTFY_SERVER, NTFY_TOPIC, NTFY_AUTH_TOKEN
 )
-from weather import fetch_weather_data
+from weather import fetch_weather_data, prewarm_weather_cache
 from decisions import analyze_sleep_conditions, analyze_daytime_conditions, format_notification_message
 from api import start_api_server
+from setup_db import ensure_schema
 
 def send_system_notification(message):
     """Send system notification using notify-send"""
@@ -39,7 +41,7 @@ def send_ntfy_notification(message, title=None):
         return
 
     try:
-        import requests
+        import http_client
 
         url = f"{NTFY_SERVER}/{NTFY_TOPIC}"
         headers = {'Content-Type': 'text/plain'}
@@ -50,7 +52,7 @@ def send_ntfy_notification(message, title=None):
         if title:
             headers['Title'] = title
 
-        response = requests.post(url, data=message, headers=headers, timeout=10)
+        response = http_client.post(url, data=message, headers=headers)
 
         if response.status_code == 200:
             print("ntfy.sh notification sent successfully")
@@ -75,7 +77,7 @@ def perform_evening_analysis():
 
     try:
         # Fetch weather data
-        weather_data = fetch_weather_data()
+        weather_data = fetch_weather_data(allow_stale=False)
         if not weather_data:
             error_msg = "SandWACH Error: Unable to fetch weather data for evening analysis"
             send_system_notification(error_msg)
@@ -108,7 +110,7 @@ def perform_morning_analysis():
 
     try:
         # Fetch weather data
-        weather_data = fetch_weather_data()
+        weather_data = fetch_weather_data(allow_stale=False)
         if not weather_data:
             error_msg = "SandWACH Error: Unable to fetch weather data for morning analysis"
             send_system_notification(error_msg)
@@ -143,6 +145,42 @@ def should_run_morning_analysis():
     current_hour = datetime.now().hour
     return current_hour == MORNING_ANALYSIS_HOUR
 
+def analysis_time_today(analysis_hour, now=None):
+    """Return today's datetime for an analysis hour"""
+    now = now or datetime.now()
+    return now.replace(hour=analysis_hour, minute=0, second=0, microsecond=0)
+
+def should_prefetch(analysis_hour):
+    """Check if we are inside the prefetch lead window before an analysis"""
+    now = datetime.now()
+    analysis_time = analysis_time_today(analysis_hour, now)
+    lead = timedelta(minutes=PRE_ANALYSIS_REFRESH_MINUTES)
+    return analysis_time - lead <= now < analysis_time
+
+def prefetch_weather_data():
+    """Warm the weather cache before an analysis, retrying on failure"""
+    for attempt in range(1, PREFETCH_RETRIES + 1):
+        print(f"Prefetching weather data (attempt {attempt}/{PREFETCH_RETRIES})")
+        if prewarm_weather_cache():
+            print("Weather cache warmed")
+            return True
+        if attempt < PREFETCH_RETRIES:
+            time.sleep(PREFETCH_RETRY_DELAY_SECONDS)
+    print("Prefetch failed, analysis will fetch on demand")
+    return False
+
+def seconds_until_next_event():
+    """Seconds until the next prefetch or analysis, capped at the check interval"""
+    now = datetime.now()
+    wait = CHECK_INTERVAL_MINUTES * 60
+    lead = timedelta(minutes=PRE_ANALYSIS_REFRESH_MINUTES)
+    for analysis_hour in (EVENING_ANALYSIS_HOUR, MORNING_ANALYSIS_HOUR):
+        analysis_time = analysis_time_today(analysis_hour, now)
+        for event in (analysis_time - lead, analysis_time, analysis_time + timedelta(days=1) - lead):
+            if event > now:
+                wait = min(wait, (event - now).total_seconds())
+    return max(wait, 1)
+
 def main_loop():
     """Main scheduling loop"""
     print("SandWACH starting up...")
@@ -153,12 +191,24 @@ def main_loop():
 
     last_evening_run = None
     last_morning_run = None
+    last_evening_prefetch = None
+    last_morning_prefetch = None
 
     while True:
         current_time = datetime.now()
         current_hour = current_time.hour
         current_date = current_time.date()
 
+        # Warm the cache ahead of each analysis
+        if should_prefetch(EVENING_ANALYSIS_HOUR):
+            if last_evening_prefetch != current_date:
+                prefetch_weather_data()
+                last_evening_prefetch = current_date
+        elif should_prefetch(MORNING_ANALYSIS_HOUR):
+            if last_morning_prefetch != current_date:
+                prefetch_weather_data()
+                last_morning_prefetch = current_date
+
         # Check for evening analysis
         if should_run_evening_analysis():
             if last_evening_run != current_date:
@@ -175,8 +225,8 @@ def main_loop():
         if current_time.minute == 0:
             print(f"[{current_time.strftime('%H:%M:%S')}] SandWACH running - waiting for analysis time")
 
-        # Sleep for check interval
-        time.sleep(CHECK_INTERVAL_MINUTES * 60)
+        # Sleep until the next prefetch/analysis or the check interval
+        time.sleep(seconds_until_next_event())
 
 def start_background_api_server():
     """Start API server in background thread"""
@@ -187,6 +237,9 @@ def start_background_api_server():
 def main():
     """Main entry point"""
     try:
+        # Bring the database schema up to date
+        ensure_schema()
+
         # Start API server in background
         start_background_api_server()
 
@@ -1,72 +1,237 @@
 #!/usr/bin/env python3
 """
 SandWACH Database Setup
-Initialize SQLite database with required tables
+Initialize and migrate the SQLite database; the schema version is
+tracked in PRAGMA user_version
 """
 
 import sqlite3
 import os
+import threading
+
+import db
 from config import DATABASE_FILE
 
-def setup_database():
-    """Create database tables and initial data"""
-    print("Setting up SandWACH database...")
+_schema_ready = False
+_schema_lock = threading.Lock()
 
-    # Create database directory if it doesn't exist
-    db_dir = os.path.dirname(DATABASE_FILE)
-    if db_dir and not os.path.exists(db_dir):
-        os.makedirs(db_dir)
+# Migrations
 
-    # Connect to database
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
+def migration_base_schema(conn):
+    """Tables that existed before versioned migrations"""
+    # The original single-location weather_cache table was never written
+    # to, so it is dropped rather than kept around
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(weather_cache)")]
+    if columns and "location" not in columns:
+        conn.execute("DROP TABLE weather_cache")
 
-    try:
-        # Create weather_cache table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weather_cache (
-                timestamp INTEGER PRIMARY KEY,
-                data TEXT NOT NULL
-            )
-        ''')
+    # Weather fetch history per location
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS weather_cache (
+            location TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (location, timestamp)
+        )
+    ''')
+
+    # Normalized forecast history
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_hours (
+            location TEXT NOT NULL,
+            issued_at INTEGER NOT NULL,
+            valid_at INTEGER NOT NULL,
+            temperature REAL,
+            conditions TEXT,
+            precip_prob INTEGER,
+            humidity REAL,
+            PRIMARY KEY (location, issued_at, valid_at)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_forecast_hours_valid_at
+        ON forecast_hours(location, valid_at, issued_at)
+    ''')
 
-        # Create notifications table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT NOT NULL CHECK (type IN ('evening', 'morning')),
-                content TEXT NOT NULL,
-                sent_at INTEGER NOT NULL
+    # Observations and their hourly/daily rollups
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS observations (
+            location TEXT NOT NULL,
+            observed_at INTEGER NOT NULL,
+            temperature REAL,
+            conditions TEXT,
+            humidity REAL,
+            PRIMARY KEY (location, observed_at)
+        )
+    ''')
+    for table in ("observation_rollups_hourly", "observation_rollups_daily"):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                location TEXT NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                temperature_min REAL,
+                temperature_max REAL,
+                temperature_sum REAL,
+                humidity_min REAL,
+                humidity_max REAL,
+                humidity_sum REAL,
+                PRIMARY KEY (location, bucket_start)
             )
         ''')
 
-        # Create indexes for performance
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notifications_sent_at
-            ON notifications(sent_at)
-        ''')
+    # Daily Accuweather call counts
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS api_usage (
+            day TEXT PRIMARY KEY,
+            calls INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
 
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notifications_type
-            ON notifications(type)
-        ''')
+    # Resolved coordinates/postal codes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS location_keys (
+            query TEXT PRIMARY KEY,
+            location_key TEXT NOT NULL,
+            name TEXT,
+            resolved_at INTEGER NOT NULL
+        )
+    ''')
+
+    # Sent notifications
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL CHECK (type IN ('evening', 'morning')),
+            content TEXT NOT NULL,
+            sent_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_sent_at
+        ON notifications(sent_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_type
+        ON notifications(type)
+    ''')
+
+def migration_open_notification_types(conn):
+    """Rebuild notifications without the evening/morning CHECK constraint"""
+    conn.execute('''
+        CREATE TABLE notifications_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            content TEXT NOT NULL,
+            sent_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO notifications_new (id, type, content, sent_at)
+        SELECT id, type, content, sent_at FROM notifications
+    ''')
+    conn.execute("DROP TABLE notifications")
+    conn.execute("ALTER TABLE notifications_new RENAME TO notifications")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_sent_at
+        ON notifications(sent_at)
+    ''')
+
+def migration_notifications_type_sent_at_index(conn):
+    """Serve "latest notifications of a type" from one composite index"""
+    create_index_online(conn, "idx_notifications_type_sent_at", "notifications", "type, sent_at")
+
+def migration_drop_weather_cache_v0(conn):
+    """Drop the empty legacy table earlier base migrations renamed instead of dropping"""
+    conn.execute("DROP TABLE IF EXISTS weather_cache_v0")
+
+# Ordered (version, description, function); append new migrations at the end
+MIGRATIONS = [
+    (1, "Base schema", migration_base_schema),
+    (2, "Allow any notification type", migration_open_notification_types),
+    (3, "Composite notifications(type, sent_at) index", migration_notifications_type_sent_at_index),
+    (4, "Drop legacy weather_cache_v0", migration_drop_weather_cache_v0),
+]
 
-        # Commit changes
-        conn.commit()
+def create_index_online(conn, name, table, columns):
+    """
+    Build an index without taking the application offline
+    In WAL mode readers keep working while SQLite builds the index; writers
+    wait on busy_timeout instead of failing.
+    """
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+
+def get_schema_version(conn):
+    """Return the schema version stored in PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate_database(conn):
+    """
+    Apply pending migrations in order, each in its own transaction
+    together with its user_version bump, so a failed migration leaves the
+    database at the previous version
+    Returns: list of applied versions
+    """
+    conn.isolation_level = None  # Manage transactions explicitly
+
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        print(f"Applying migration {version}: {description}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock in case another process migrated
+            if version <= get_schema_version(conn):
+                conn.execute("ROLLBACK")
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        applied.append(version)
+    return applied
+
+def ensure_schema():
+    """Migrate the database once per process before first use"""
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if not _schema_ready:
+            conn = db.connect()
+            try:
+                migrate_database(conn)
+            finally:
+                conn.close()
+            _schema_ready = True
+
+def setup_database():
+    """Create database tables by applying all pending migrations"""
+    print("Setting up SandWACH database...")
+
+    # Connect to database (creating its directory if needed)
+    conn = db.connect()
+
+    try:
+        applied = migrate_database(conn)
 
         print(f"Database setup complete: {DATABASE_FILE}")
-        print("Tables created:")
-        print("  - weather_cache")
-        print("  - notifications")
+        print(f"Schema version: {get_schema_version(conn)}")
+        if applied:
+            print(f"Applied migrations: {applied}")
+        else:
+            print("Schema already up to date")
 
         # Show table info
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
         print(f"\nCreated tables: {[table[0] for table in tables]}")
 
     except sqlite3.Error as e:
         print(f"Database error: {e}")
-        conn.rollback()
     finally:
         conn.close()
 
@@ -76,11 +241,12 @@ def show_database_info():
         print(f"Database file does not exist: {DATABASE_FILE}")
         return
 
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = db.connect()
     cursor = conn.cursor()
 
     try:
-        # Show tables
+        # Show schema version and tables
+        print(f"Schema version: {get_schema_version(conn)}")
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tables = cursor.fetchall()
         print(f"Tables: {[table[0] for table in tables]}")
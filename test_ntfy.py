@@ -16,7 +16,7 @@ def send_ntfy_notification(message, title=None):
         return
 
     try:
-        import requests
+        import http_client
 
         url = f"{NTFY_SERVER}/{NTFY_TOPIC}"
         headers = {'Content-Type': 'text/plain'}
@@ -31,7 +31,7 @@ def send_ntfy_notification(message, title=None):
         print(f"Message: {message}")
         print(f"Title: {title}")
 
-        response = requests.post(url, data=message, headers=headers, timeout=10)
+        response = http_client.post(url, data=message, headers=headers)
 
         if response.status_code == 200:
             print("✅ ntfy.sh notification sent successfully")
@@ -1,90 +1,283 @@
 #!/usr/bin/env python3
 """
 SandWACH Weather Module
-Simple Accuweather API client with caching
+Weather client with caching; upstream backends live in providers.py
 """
 
 import json
+import os
+import sqlite3
+import tempfile
+import threading
 import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; refreshes then only coordinate in-process
+    fcntl = None
 import requests
+import budget
+import decisions
+import locations
+import providers
+import weather_store
 from config import (
-    API_KEY, LOCATION_KEY, API_BASE_URL,
-    WEATHER_CACHE_FILE, CACHE_DURATION_HOURS
+    LOCATION_KEY, LOCATION_KEYS, MAX_CONCURRENT_FETCHES, WEATHER_PROVIDERS,
+    WEATHER_CACHE_BACKEND, WEATHER_CACHE_FILE, CACHE_DURATION_HOURS, CACHE_STALE_WINDOW_HOURS,
+    REFRESH_WAIT_TIMEOUT_SECONDS, FORECAST_ROLLOVER_GRACE_MINUTES,
+    PRE_ANALYSIS_REFRESH_MINUTES, EVENING_ANALYSIS_HOUR, MORNING_ANALYSIS_HOUR,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_PROBE_INTERVAL_SECONDS, CIRCUIT_PROBE_TIMEOUT_SECONDS,
+    WEATHER_HEDGING, HEDGE_DEFAULT_DELAY_SECONDS, HEDGE_MIN_SAMPLES
 )
 
-def fetch_weather_data():
+# In-memory snapshots of the last parsed weather data, keyed by location
+# key. Each dict is replaced wholesale on refresh and never mutated, so
+# readers can share it freely.
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+# Refreshes currently running, keyed by location key. Each entry holds an
+# Event that is set once the leader has stored its result.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Circuit breakers around each provider, keyed by provider name:
+# closed -> open after CIRCUIT_FAILURE_THRESHOLD consecutive failures
+# -> half_open probe
+_circuits = {}
+_circuit_lock = threading.Lock()
+
+# Per-provider latency histograms of successful fetches. Counts are kept
+# per bucket of LATENCY_BUCKETS_SECONDS, plus one overflow bucket.
+LATENCY_BUCKETS_SECONDS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+_latency = {}
+_latency_lock = threading.Lock()
+
+# Shared pool for hedged fetches so a slow loser never blocks the winner
+_hedge_executor = ThreadPoolExecutor(max_workers=4)
+
+def fetch_weather_data(allow_stale=True, location_key=LOCATION_KEY):
+    """
+    Fetch current weather and forecast from the configured providers
+    With allow_stale, expired data inside the stale window is returned
+    immediately while a background refresh runs.
+    Returns: dict with current and forecast data plus age_seconds/stale,
+    or None on error
+    """
+    # Check cache first
+    cached_data = load_weather_cache(location_key)
+    if cached_data and is_cache_valid(cached_data):
+        print(f"Using cached weather data for {location_key}")
+        return with_staleness(cached_data)
+
+    # Stale-while-revalidate: serve the last good data, refresh in background
+    if allow_stale and cached_data and is_cache_within_stale_window(cached_data):
+        print(f"Using stale weather data for {location_key} while refreshing in background")
+        start_background_refresh(location_key)
+        return with_staleness(cached_data)
+
+    return with_staleness(refresh_weather_data(location_key))
+
+def fetch_weather_by_position(latitude, longitude, allow_stale=True):
+    """
+    Fetch weather for coordinates, resolving them to a location key once
+    Returns: weather data, or None if the position could not be resolved
+    """
+    location_key = locations.resolve_by_position(latitude, longitude)
+    if location_key is None:
+        return None
+    return fetch_weather_data(allow_stale, location_key)
+
+def fetch_weather_batch(location_keys, allow_stale=True, force=False):
+    """
+    Fetch several locations concurrently, at most MAX_CONCURRENT_FETCHES
+    at a time. Duplicate keys are fetched once, and refreshes already in
+    flight for other callers are shared through single-flight.
+    Returns: dict of location key -> weather data (or None)
     """
-    Fetch current weather and forecast from Accuweather API
-    Returns: dict with current and forecast data, or None on error
+    unique_keys = list(dict.fromkeys(location_keys))
+    if force:
+        fetch = lambda key: refresh_weather_data(key, force=True)
+    else:
+        fetch = lambda key: fetch_weather_data(allow_stale, key)
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES) as executor:
+        results = executor.map(fetch, unique_keys)
+        return dict(zip(unique_keys, results))
+
+def start_background_refresh(location_key):
+    """Start a background refresh unless one is already in flight"""
+    with _inflight_lock:
+        if location_key in _inflight:
+            return
+    thread = threading.Thread(target=refresh_weather_data, args=(location_key,), daemon=True)
+    thread.start()
+
+def with_staleness(weather_data):
+    """Return a shallow copy of weather data annotated with its age"""
+    if not weather_data:
+        return weather_data
+    age_seconds = max(int(time.time() - weather_data.get('fetched_at', 0)), 0)
+    return {
+        **weather_data,
+        "age_seconds": age_seconds,
+        "stale": not is_cache_valid(weather_data)
+    }
+
+def prewarm_weather_cache(location_keys=LOCATION_KEYS):
     """
+    Force a refresh of every location ahead of a scheduled analysis
+    Returns: True if fresh data was fetched and cached for all of them
+    """
+    started = int(time.time())
+    fetch_weather_batch(location_keys, force=True)
+    for location_key in location_keys:
+        cached_data = load_weather_cache(location_key)
+        if not cached_data or cached_data.get('fetched_at', 0) < started:
+            return False
+    return True
+
+def refresh_weather_data(location_key, force=False):
+    """
+    Refresh weather data with at most one upstream fetch per location key
+    Concurrent callers wait for the in-flight refresh and share its result
+    (fresh data, cached fallback or None), giving up after
+    REFRESH_WAIT_TIMEOUT_SECONDS and falling back to the cache.
+    With force, the leader fetches even if the cache is still valid.
+    """
+    with _inflight_lock:
+        flight = _inflight.get(location_key)
+        is_leader = flight is None
+        if is_leader:
+            flight = {"event": threading.Event(), "result": None}
+            _inflight[location_key] = flight
+
+    if not is_leader:
+        print("Waiting for in-flight weather refresh")
+        if not flight["event"].wait(REFRESH_WAIT_TIMEOUT_SECONDS):
+            print("Timed out waiting for weather refresh, using cached data")
+            return load_weather_cache(location_key)
+        return flight["result"]
+
     try:
-        # Check cache first
-        cached_data = load_weather_cache()
-        if cached_data and is_cache_valid(cached_data):
-            print("Using cached weather data")
-            return cached_data
-
-        print("Fetching fresh weather data from API")
-
-        # Fetch current conditions
-        current_url = f"{API_BASE_URL}/currentconditions/v1/{LOCATION_KEY}"
-        params = {"apikey": API_KEY, "details": "true"}
-        print(f"Requesting: {current_url}")
-        print(f"Params: {params}")
-        current_response = requests.get(current_url, params=params, timeout=30)
-        print(f"Response URL: {current_response.url}")
-        print(f"Response Status: {current_response.status_code}")
-        try:
-            current_response.raise_for_status()
-            current_data = current_response.json()[0]
-        except requests.HTTPError as http_err:
-            print(f"HTTP Error: {http_err}")
-            print(f"Response Text: {current_response.text}")
-            raise
-
-        # DEBUG: Print raw current conditions response
-        print("=== RAW CURRENT CONDITIONS RESPONSE ===")
-        print(json.dumps(current_response.json(), indent=2))
-        print("=== END RAW CURRENT ===")
-
-        # Fetch hourly forecast (12 hours for analysis)
-        forecast_url = f"{API_BASE_URL}/forecasts/v1/hourly/12hour/{LOCATION_KEY}"
-        forecast_response = requests.get(forecast_url, params=params, timeout=30)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
-
-        # DEBUG: Print raw forecast response
-        print("=== RAW FORECAST RESPONSE ===")
-        print(json.dumps(forecast_response.json(), indent=2))
-        print("=== END RAW FORECAST ===")
-
-        # Combine data
-        weather_data = {
-            "current": {
-                "temperature": current_data["Temperature"]["Imperial"]["Value"],
-                "conditions": current_data["WeatherText"],
-                "humidity": current_data.get("RelativeHumidity", 0),
-                "timestamp": current_data["EpochTime"]
-            },
-            "forecast": [
-                {
-                    "time": hour["EpochDateTime"],
-                    "temperature": hour["Temperature"]["Value"],
-                    "conditions": hour["IconPhrase"],
-                    "precipitation_probability": hour.get("PrecipitationProbability", 0)
-                }
-                for hour in forecast_data
-            ],
-            "fetched_at": int(time.time())
-        }
+        # Another refresh may have finished between the cache check and here
+        cached_data = load_weather_cache(location_key)
+        if not force and cached_data and is_cache_valid(cached_data):
+            flight["result"] = cached_data
+        else:
+            # Hold the cross-process lock so other SandWACH processes wait
+            # for this refresh instead of starting their own
+            with refresh_lock(location_key):
+                cached_data = _reload_from_store(location_key, cached_data)
+                if not force and cached_data and is_cache_valid(cached_data):
+                    print(f"Weather data for {location_key} refreshed by another process")
+                    flight["result"] = cached_data
+                else:
+                    flight["result"] = _fetch_fresh_weather_data(location_key, cached_data)
+    finally:
+        with _inflight_lock:
+            del _inflight[location_key]
+        flight["event"].set()
+
+    return flight["result"]
 
-        # Cache the data
-        save_weather_cache(weather_data)
+def _fetch_fresh_weather_data(location_key, cached_data):
+    """
+    Fetch from the configured providers in order, failing over on errors
+    With WEATHER_HEDGING, a slow primary is hedged with the next provider.
+    Returns: dict with current and forecast data, cached fallback, or None
+    """
+    if WEATHER_HEDGING and len(WEATHER_PROVIDERS) > 1:
+        weather_data, complete = _fetch_hedged(location_key, cached_data)
+    else:
+        weather_data, complete = None, False
+        for provider in WEATHER_PROVIDERS:
+            weather_data, complete = _try_provider(provider, location_key, cached_data)
+            if weather_data:
+                break
 
+    if weather_data:
+        # Only the returned result is stored, and only when complete so a
+        # partial result is retried
+        if complete:
+            save_weather_cache(weather_data, location_key)
         return weather_data
 
+    # Return cached data as fallback
+    cached_data = load_weather_cache(location_key)
+    if cached_data:
+        print("Using cached data as fallback")
+        return cached_data
+    return None
+
+def _fetch_hedged(location_key, cached_data):
+    """
+    Issue the primary fetch and, once it runs past its observed p95
+    latency, race it against the next provider. The first valid response
+    wins; the loser is cancelled if not started, otherwise ignored (it only
+    records its latency and circuit outcome, never the snapshot).
+    Returns: (weather data, complete), or (None, False) if every provider failed
+    """
+    providers_left = list(WEATHER_PROVIDERS)
+    pending = set()
+
+    while providers_left:
+        provider = providers_left.pop(0)
+        if not providers.supports_location(provider, location_key):
+            print(f"{provider} has no coordinates for {location_key}, skipping")
+            continue
+        if not circuit_allows_request(provider):
+            print(f"Weather circuit open for {provider}, skipping")
+            continue
+
+        pending.add(_hedge_executor.submit(_try_provider, provider, location_key, cached_data, False))
+        hedge_delay = get_hedge_delay(provider) if providers_left else None
+
+        # Wait for a winner, or for the hedge delay before adding a provider
+        while pending:
+            done, pending = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result()[0]:
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+            if not done:
+                print(f"{provider} slower than {hedge_delay:.2f}s, hedging with next provider")
+                break
+
+    # No provider left to hedge with: keep waiting on the ones still running
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.result()[0]:
+                for loser in pending:
+                    loser.cancel()
+                return future.result()
+
+    return None, False
+
+def _try_provider(provider, location_key, cached_data, check_circuit=True):
+    """
+    Fetch from one provider, recording its latency and circuit outcome
+    Returns: (weather data, complete), or (None, False) on failure
+    """
+    # Not a provider failure, so it must not count against the circuit
+    if not providers.supports_location(provider, location_key):
+        print(f"{provider} has no coordinates for {location_key}, skipping")
+        return None, False
+    if check_circuit and not circuit_allows_request(provider):
+        print(f"Weather circuit open for {provider}, skipping")
+        return None, False
+
+    started = time.monotonic()
+    try:
+        weather_data, complete = _fetch_from_provider(provider, location_key, cached_data)
     except requests.RequestException as e:
-        print(f"API request failed: {e}")
+        print(f"API request to {provider} failed: {e}")
+        record_circuit_failure(provider)
         # DEBUG: Print response details on error
         if hasattr(e, 'response') and e.response:
             print("=== ERROR RESPONSE DETAILS ===")
@@ -95,39 +288,392 @@ def fetch_weather_data():
             except:
                 print("Could not read response body")
             print("=== END ERROR RESPONSE ===")
-        # Return cached data as fallback
-        cached_data = load_weather_cache()
-        if cached_data:
-            print("Using cached data as fallback")
-            return cached_data
-        return None
+        return None, False
     except Exception as e:
-        print(f"Unexpected error in weather fetch: {e}")
+        print(f"Unexpected error fetching from {provider}: {e}")
+        record_circuit_failure(provider)
+        return None, False
+
+    record_latency(provider, time.monotonic() - started)
+    return weather_data, complete
+
+def record_latency(provider, seconds):
+    """Add a successful fetch duration to the provider's histogram"""
+    index = bisect_left(LATENCY_BUCKETS_SECONDS, seconds)
+    with _latency_lock:
+        counts = _latency.setdefault(provider, [0] * (len(LATENCY_BUCKETS_SECONDS) + 1))
+        counts[index] += 1
+
+def latency_percentile(provider, percentile):
+    """
+    Estimate a latency percentile from the provider's histogram
+    Returns: upper bound of the matching bucket in seconds, or None
+    when there are fewer than HEDGE_MIN_SAMPLES samples
+    """
+    with _latency_lock:
+        counts = list(_latency.get(provider, []))
+    total = sum(counts)
+    if total < HEDGE_MIN_SAMPLES:
         return None
 
-def load_weather_cache():
-    """Load cached weather data from file"""
+    threshold = total * percentile / 100
+    cumulative = 0
+    for index, count in enumerate(counts):
+        cumulative += count
+        if cumulative >= threshold:
+            if index < len(LATENCY_BUCKETS_SECONDS):
+                return LATENCY_BUCKETS_SECONDS[index]
+            return LATENCY_BUCKETS_SECONDS[-1]
+    return None
+
+def get_hedge_delay(provider):
+    """Seconds to wait on a provider before hedging: its p95, or the default"""
+    p95 = latency_percentile(provider, 95)
+    return p95 if p95 is not None else HEDGE_DEFAULT_DELAY_SECONDS
+
+def get_latency_stats():
+    """Per-provider sample counts and latency percentiles"""
+    with _latency_lock:
+        providers_seen = list(_latency)
+        totals = {provider: sum(counts) for provider, counts in _latency.items()}
+    return {
+        provider: {
+            "samples": totals[provider],
+            "p50_seconds": latency_percentile(provider, 50),
+            "p95_seconds": latency_percentile(provider, 95)
+        }
+        for provider in providers_seen
+    }
+
+def _fetch_from_provider(provider, location_key, cached_data):
+    """
+    Fetch current conditions and forecast from one provider concurrently
+    If only one of them fails, the matching section of the cached data is reused.
+    Nothing is stored here; the caller saves the result it returns.
+    Returns: (combined weather data, complete); raises if nothing usable
+    was fetched
+    """
+    print(f"Fetching fresh weather data for {location_key} from {provider}")
+    backend = providers.get_provider(provider)
+
+    # Send validators from the cached snapshot so unchanged data costs a 304
+    http_cache = {}
+    if cached_data and cached_data.get("provider") == provider:
+        http_cache = cached_data.get("http_cache") or {}
+
+    # Fetch current conditions and hourly forecast at the same time
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        current_future = executor.submit(backend["current"], location_key, http_cache.get("current"))
+        forecast_future = executor.submit(backend["forecast"], location_key, http_cache.get("forecast"))
+        current_result, current_error = _future_result(current_future)
+        forecast_result, forecast_error = _future_result(forecast_future)
+
+    if current_error and forecast_error:
+        raise current_error
+
+    current, current_meta = current_result or (None, None)
+    forecast, forecast_meta = forecast_result or (None, None)
+
+    # 304 Not Modified: keep the cached section as-is, without re-parsing
+    if current_meta is not None and current is None:
+        print("Current conditions not modified")
+        current = cached_data.get("current")
+    if forecast_meta is not None and forecast is None:
+        print("Forecast not modified")
+        forecast = cached_data.get("forecast")
+
+    # Partial failure: fill the failed section from the cache
+    if current_error or forecast_error:
+        failed = "current conditions" if current_error else "forecast"
+        print(f"Partial fetch failure ({failed}): {current_error or forecast_error}")
+        if not cached_data:
+            raise current_error or forecast_error
+        if current_error:
+            current = cached_data.get("current")
+        else:
+            forecast = cached_data.get("forecast")
+        if current is None or forecast is None:
+            raise current_error or forecast_error
+
+    if current is None or forecast is None:
+        raise ValueError("Provider returned 304 without cached data")
+
+    # Combine data
+    weather_data = {
+        "current": current,
+        "forecast": forecast,
+        "fetched_at": int(time.time()),
+        "provider": provider,
+        "location": location_key,
+        "http_cache": {
+            "current": current_meta if current_meta is not None else http_cache.get("current", {}),
+            "forecast": forecast_meta if forecast_meta is not None else http_cache.get("forecast", {})
+        }
+    }
+
+    # A partial failure counts against the circuit so probes resolve
+    complete = not (current_error or forecast_error)
+    if complete:
+        record_circuit_success(provider)
+    else:
+        record_circuit_failure(provider)
+
+    return weather_data, complete
+
+def _get_circuit(provider):
+    """Return the breaker for a provider, creating it closed (lock held)"""
+    if provider not in _circuits:
+        _circuits[provider] = {
+            "state": "closed",
+            "failures": 0,
+            "opened_at": None,
+            "next_probe_at": None,
+            "probe_started_at": None,
+            "last_failure_at": None
+        }
+    return _circuits[provider]
+
+def circuit_allows_request(provider):
+    """
+    Check a provider's circuit breaker before calling upstream
+    While open, requests fail fast until the next probe time, when a
+    single half-open probe is let through. A probe that reports no outcome
+    within CIRCUIT_PROBE_TIMEOUT_SECONDS (e.g. a cancelled hedge) is
+    treated as lost and replaced by a new one.
+    """
+    now = time.time()
+    with _circuit_lock:
+        circuit = _get_circuit(provider)
+        if circuit["state"] == "closed":
+            return True
+        if circuit["state"] == "half_open" and now >= circuit["probe_started_at"] + CIRCUIT_PROBE_TIMEOUT_SECONDS:
+            print(f"Weather circuit probe for {provider} timed out")
+            circuit["state"] = "open"
+            circuit["next_probe_at"] = now
+        if circuit["state"] == "open" and now >= circuit["next_probe_at"]:
+            print(f"Weather circuit for {provider} half-open, probing upstream")
+            circuit["state"] = "half_open"
+            circuit["probe_started_at"] = int(now)
+            return True
+        return False
+
+def record_circuit_success(provider):
+    """Close a provider's circuit after a successful fetch"""
+    with _circuit_lock:
+        circuit = _get_circuit(provider)
+        if circuit["state"] != "closed":
+            print(f"Weather circuit for {provider} closed")
+        circuit["state"] = "closed"
+        circuit["failures"] = 0
+        circuit["opened_at"] = None
+        circuit["next_probe_at"] = None
+        circuit["probe_started_at"] = None
+
+def record_circuit_failure(provider):
+    """Count a failed fetch, opening the circuit at the threshold"""
+    with _circuit_lock:
+        circuit = _get_circuit(provider)
+        circuit["failures"] += 1
+        circuit["last_failure_at"] = int(time.time())
+        if circuit["state"] == "half_open" or circuit["failures"] >= CIRCUIT_FAILURE_THRESHOLD:
+            if circuit["state"] != "open":
+                print(f"Weather circuit for {provider} opened after {circuit['failures']} failures")
+                circuit["opened_at"] = int(time.time())
+            circuit["state"] = "open"
+            circuit["next_probe_at"] = int(time.time()) + CIRCUIT_PROBE_INTERVAL_SECONDS
+            circuit["probe_started_at"] = None
+
+def get_circuit_state():
+    """Snapshot of every configured provider's circuit breaker"""
+    with _circuit_lock:
+        return {provider: dict(_get_circuit(provider)) for provider in WEATHER_PROVIDERS}
+
+def _future_result(future):
+    """Return (result, error) for a finished fetch future"""
     try:
-        with open(WEATHER_CACHE_FILE, 'r') as f:
+        return future.result(), None
+    except Exception as e:
+        return None, e
+
+@contextmanager
+def refresh_lock(location_key):
+    """Exclusive fcntl lock on a location's lock file for the duration of a refresh"""
+    if fcntl is None:
+        yield
+        return
+
+    with open(get_cache_file(location_key) + ".lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _reload_from_store(location_key, cached_data):
+    """Adopt a newer snapshot another process may have written to the store"""
+    stored = read_weather_cache_store(location_key)
+    if stored and (not cached_data or stored.get('fetched_at', 0) > cached_data.get('fetched_at', 0)):
+        _swap_snapshot(location_key, stored)
+        return stored
+    return cached_data
+
+def _swap_snapshot(location_key, data):
+    """Replace a location's snapshot unless it already holds newer data"""
+    with _snapshot_lock:
+        snapshot = _snapshots.get(location_key)
+        if snapshot is None or data.get('fetched_at', 0) >= snapshot.get('fetched_at', 0):
+            _snapshots[location_key] = data
+            replaced = snapshot is not None and snapshot.get('fetched_at') != data.get('fetched_at')
+        else:
+            replaced = False
+
+    # Analyses of the previous snapshot will never be asked for again
+    if replaced:
+        decisions.invalidate_recommendations(location_key)
+
+def load_weather_cache(location_key=LOCATION_KEY):
+    """Return a location's in-memory snapshot, reading the cache store only once"""
+    snapshot = _snapshots.get(location_key)
+    if snapshot is not None:
+        return snapshot
+
+    with _snapshot_lock:
+        if location_key not in _snapshots:
+            snapshot = read_weather_cache_store(location_key)
+            if snapshot is None:
+                return None
+            _snapshots[location_key] = snapshot
+        return _snapshots[location_key]
+
+def get_cache_file(location_key):
+    """Cache file for a location, e.g. weather_cache_327347.json"""
+    base, ext = os.path.splitext(WEATHER_CACHE_FILE)
+    return f"{base}_{location_key}{ext}"
+
+def read_weather_cache_store(location_key=LOCATION_KEY):
+    """Load the latest cached weather data for a location"""
+    if WEATHER_CACHE_BACKEND == "sqlite":
+        try:
+            return weather_store.load_latest_snapshot(location_key)
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"Failed to read weather cache: {e}")
+            return None
+
+    try:
+        with open(get_cache_file(location_key), 'r') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return None
 
-def save_weather_cache(data):
-    """Save weather data to cache file"""
+def save_weather_cache(data, location_key=LOCATION_KEY):
+    """Save a location's weather data to the cache store and swap in the new snapshot"""
+    # Never replace a newer snapshot with an older fetch
+    _swap_snapshot(location_key, data)
+
     try:
-        with open(WEATHER_CACHE_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        if WEATHER_CACHE_BACKEND == "sqlite":
+            weather_store.save_snapshot(location_key, data)
+        else:
+            write_weather_cache_file(get_cache_file(location_key), data)
+            weather_store.save_history(location_key, data)
     except Exception as e:
         print(f"Failed to save cache: {e}")
 
+def write_weather_cache_file(path, data):
+    """
+    Atomically replace a cache file: compact JSON to a temp file in the
+    same directory, fsync, then rename over the old file, so readers see
+    either the old or the new contents and never a truncated file
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".weather_cache.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    # Make the rename itself durable
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
 def is_cache_valid(cached_data):
     """Check if cached data is still valid"""
     if not cached_data or 'fetched_at' not in cached_data:
         return False
 
-    cache_age_hours = (time.time() - cached_data['fetched_at']) / 3600
-    return cache_age_hours < CACHE_DURATION_HOURS
+    return time.time() < get_cache_expiry(cached_data)
+
+def is_cache_within_stale_window(cached_data):
+    """Check if expired cached data may still be served while refreshing"""
+    if not cached_data or 'fetched_at' not in cached_data:
+        return False
+
+    return time.time() < get_cache_expiry(cached_data) + CACHE_STALE_WINDOW_HOURS * 3600
+
+def get_cache_expiry(cached_data):
+    """
+    Work out when cached data expires
+    The cache lives for the provider's freshness lifetime (or at most
+    CACHE_DURATION_HOURS without one), but expires earlier when
+    the forecast rolls over (its first hour starts) or just before a
+    scheduled analysis so the analysis sees a fresh forecast. Ad-hoc
+    refreshes are spaced out by the call budget; the pre-analysis refresh
+    uses calls the budget has reserved.
+    Returns: expiry as epoch seconds
+    """
+    fetched_at = cached_data['fetched_at']
+    expiry = fetched_at + get_freshness_lifetime(cached_data)
+
+    # Refresh right after the first forecast hour begins
+    for hour in cached_data.get('forecast') or []:
+        if hour['time'] > fetched_at:
+            expiry = min(expiry, hour['time'] + FORECAST_ROLLOVER_GRACE_MINUTES * 60)
+            break
+
+    # Stretch the lifetime when the daily call budget is running low
+    expiry = max(expiry, fetched_at + budget.min_refresh_interval())
+
+    # Refresh shortly before the next evening/morning analysis
+    for analysis_time in next_analysis_times(fetched_at):
+        refresh_at = analysis_time - PRE_ANALYSIS_REFRESH_MINUTES * 60
+        if fetched_at < refresh_at:
+            expiry = min(expiry, refresh_at)
+
+    return expiry
+
+def get_freshness_lifetime(cached_data):
+    """
+    Seconds the data stays fresh: the shortest Cache-Control/Expires
+    lifetime the provider sent, or CACHE_DURATION_HOURS without hints
+    """
+    http_cache = cached_data.get('http_cache') or {}
+    max_ages = [
+        section['max_age'] for section in http_cache.values()
+        if section and section.get('max_age') is not None
+    ]
+    if max_ages:
+        return min(max_ages)
+    return CACHE_DURATION_HOURS * 3600
+
+def next_analysis_times(after):
+    """Return the next local evening and morning analysis times after an epoch"""
+    start = datetime.fromtimestamp(after)
+    times = []
+    for hour in (EVENING_ANALYSIS_HOUR, MORNING_ANALYSIS_HOUR):
+        candidate = start.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if candidate.timestamp() <= after:
+            candidate += timedelta(days=1)
+        times.append(candidate.timestamp())
+    return times
 
 def get_current_temperature(weather_data):
     """Extract current temperature from weather data"""
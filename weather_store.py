@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+SandWACH Weather Store
+Keeps every weather fetch in the SQLite weather_cache table, one row per
+location and fetch time, with a retention window. Forecast hours are also
+normalized into forecast_hours for time-range and evolution queries, and
+current conditions go into observations with hourly/daily rollups that are
+updated as each observation is inserted.
+"""
+
+import json
+import time
+from datetime import datetime
+
+import db
+from config import WEATHER_HISTORY_RETENTION_DAYS
+
+INSERT_SNAPSHOT = '''
+    INSERT OR REPLACE INTO weather_cache (location, timestamp, data)
+    VALUES (?, ?, ?)
+'''
+DELETE_EXPIRED = '''
+    DELETE FROM weather_cache WHERE location = ? AND timestamp < ?
+'''
+SELECT_LATEST = '''
+    SELECT data FROM weather_cache
+    WHERE location = ?
+    ORDER BY timestamp DESC
+    LIMIT 1
+'''
+INSERT_FORECAST_HOUR = '''
+    INSERT OR REPLACE INTO forecast_hours
+        (location, issued_at, valid_at, temperature, conditions, precip_prob, humidity)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+DELETE_EXPIRED_FORECAST_HOURS = '''
+    DELETE FROM forecast_hours WHERE location = ? AND issued_at < ?
+'''
+SELECT_EVOLUTION = '''
+    SELECT issued_at, temperature, conditions, precip_prob, humidity
+    FROM forecast_hours
+    WHERE location = ? AND valid_at = ?
+    ORDER BY issued_at
+'''
+SELECT_LATEST_RANGE = '''
+    SELECT valid_at, temperature, conditions, precip_prob, humidity
+    FROM forecast_hours
+    WHERE location = ?
+      AND issued_at = (SELECT MAX(issued_at) FROM forecast_hours WHERE location = ? AND issued_at <= ?)
+      AND valid_at BETWEEN ? AND ?
+    ORDER BY valid_at
+'''
+INSERT_OBSERVATION = '''
+    INSERT OR IGNORE INTO observations (location, observed_at, temperature, conditions, humidity)
+    VALUES (?, ?, ?, ?, ?)
+'''
+DELETE_EXPIRED_OBSERVATIONS = '''
+    DELETE FROM observations WHERE location = ? AND observed_at < ?
+'''
+# Rollup upserts: {table} is observation_rollups_hourly or _daily
+UPSERT_ROLLUP = '''
+    INSERT INTO {table} (
+        location, bucket_start, count,
+        temperature_min, temperature_max, temperature_sum,
+        humidity_min, humidity_max, humidity_sum
+    )
+    VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(location, bucket_start) DO UPDATE SET
+        count = count + 1,
+        temperature_min = MIN(temperature_min, excluded.temperature_min),
+        temperature_max = MAX(temperature_max, excluded.temperature_max),
+        temperature_sum = temperature_sum + excluded.temperature_sum,
+        humidity_min = MIN(humidity_min, excluded.humidity_min),
+        humidity_max = MAX(humidity_max, excluded.humidity_max),
+        humidity_sum = humidity_sum + excluded.humidity_sum
+'''
+SELECT_ROLLUPS = '''
+    SELECT bucket_start, count,
+           temperature_min, temperature_max, temperature_sum,
+           humidity_min, humidity_max, humidity_sum
+    FROM {table}
+    WHERE location = ? AND bucket_start BETWEEN ? AND ?
+    ORDER BY bucket_start
+'''
+ROLLUP_TABLES = {
+    "hourly": "observation_rollups_hourly",
+    "daily": "observation_rollups_daily"
+}
+SELECT_HISTORY = '''
+    SELECT data FROM weather_cache
+    WHERE location = ? AND timestamp BETWEEN ? AND ?
+    ORDER BY timestamp
+'''
+
+def save_snapshot(location_key, data):
+    """Insert a fetch and its forecast hours, pruning expired history, in one transaction"""
+    min_timestamp = int(time.time()) - WEATHER_HISTORY_RETENTION_DAYS * 86400
+    snapshot = json.dumps(data)
+
+    def write(conn):
+        conn.execute(INSERT_SNAPSHOT, (location_key, data['fetched_at'], snapshot))
+        conn.execute(DELETE_EXPIRED, (location_key, min_timestamp))
+        _insert_forecast_hours(conn, location_key, data, min_timestamp)
+        _insert_observation(conn, location_key, data, min_timestamp)
+
+    db.write(write)
+
+def save_history(location_key, data):
+    """Insert a fetch's forecast hours and observation on their own (file cache backend)"""
+    min_timestamp = int(time.time()) - WEATHER_HISTORY_RETENTION_DAYS * 86400
+
+    def write(conn):
+        _insert_forecast_hours(conn, location_key, data, min_timestamp)
+        _insert_observation(conn, location_key, data, min_timestamp)
+
+    db.write(write)
+
+def _insert_forecast_hours(conn, location_key, data, min_timestamp):
+    """Batch insert forecast rows issued at the fetch time and prune old issues"""
+    issued_at = data['fetched_at']
+    rows = [
+        (
+            location_key, issued_at, hour['time'], hour['temperature'],
+            hour.get('conditions'), hour.get('precipitation_probability'), hour.get('humidity')
+        )
+        for hour in data.get('forecast') or []
+    ]
+    conn.executemany(INSERT_FORECAST_HOUR, rows)
+    conn.execute(DELETE_EXPIRED_FORECAST_HOURS, (location_key, min_timestamp))
+
+def _insert_observation(conn, location_key, data, min_timestamp):
+    """
+    Insert the current conditions and fold them into the rollups
+    An observation already stored (same observation time, e.g. after a
+    304) is skipped so the rollups never count it twice.
+    """
+    current = data.get('current')
+    if not current or current.get('timestamp') is None:
+        return
+
+    observed_at = current['timestamp']
+    temperature = current.get('temperature')
+    humidity = current.get('humidity')
+    cursor = conn.execute(INSERT_OBSERVATION, (
+        location_key, observed_at, temperature, current.get('conditions'), humidity
+    ))
+    if cursor.rowcount == 1:
+        day_start = int(datetime.fromtimestamp(observed_at).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ).timestamp())
+        buckets = {"hourly": observed_at // 3600 * 3600, "daily": day_start}
+        for period, table in ROLLUP_TABLES.items():
+            conn.execute(UPSERT_ROLLUP.format(table=table), (
+                location_key, buckets[period],
+                temperature, temperature, temperature,
+                humidity, humidity, humidity
+            ))
+    conn.execute(DELETE_EXPIRED_OBSERVATIONS, (location_key, min_timestamp))
+
+def get_observation_rollups(location_key, period, start, end):
+    """
+    Hourly or daily observation summaries between two epochs
+    Returns: list of dicts with bucket_start, count and min/max/mean
+    temperature and humidity
+    """
+    table = ROLLUP_TABLES[period]
+    rows = db.query(SELECT_ROLLUPS.format(table=table), (location_key, start, end))
+    return [
+        {
+            "bucket_start": bucket_start,
+            "count": count,
+            "temperature_min": temperature_min,
+            "temperature_max": temperature_max,
+            "temperature_mean": round(temperature_sum / count, 1) if temperature_sum is not None else None,
+            "humidity_min": humidity_min,
+            "humidity_max": humidity_max,
+            "humidity_mean": round(humidity_sum / count, 1) if humidity_sum is not None else None
+        }
+        for (bucket_start, count, temperature_min, temperature_max, temperature_sum,
+             humidity_min, humidity_max, humidity_sum) in rows
+    ]
+
+def get_forecast_evolution(location_key, valid_at):
+    """
+    Every forecast issued for one hour, oldest issue first
+    Returns: list of dicts with issued_at, temperature, conditions,
+    precip_prob and humidity
+    """
+    rows = db.query(SELECT_EVOLUTION, (location_key, valid_at))
+    return [
+        dict(zip(("issued_at", "temperature", "conditions", "precip_prob", "humidity"), row))
+        for row in rows
+    ]
+
+def get_forecast_range(location_key, start, end, as_of=None):
+    """
+    Hours between two epochs from the latest forecast issued by as_of
+    (default now)
+    Returns: list of dicts with valid_at, temperature, conditions,
+    precip_prob and humidity
+    """
+    as_of = int(time.time()) if as_of is None else as_of
+    rows = db.query(SELECT_LATEST_RANGE, (location_key, location_key, as_of, start, end))
+    return [
+        dict(zip(("valid_at", "temperature", "conditions", "precip_prob", "humidity"), row))
+        for row in rows
+    ]
+
+def load_latest_snapshot(location_key):
+    """
+    Read the most recent fetch for a location
+    Returns: weather data dict, or None if there is none
+    """
+    row = db.query_one(SELECT_LATEST, (location_key,))
+    return json.loads(row[0]) if row else None
+
+def load_history(location_key, start, end):
+    """
+    Read all fetches for a location between two epochs
+    Returns: list of weather data dicts, oldest first
+    """
+    rows = db.query(SELECT_HISTORY, (location_key, start, end))
+    return [json.loads(row[0]) for row in rows]
+
+# Test function
+if __name__ == "__main__":
+    import sys
+    from config import LOCATION_KEY
+
+    location_key = sys.argv[1] if len(sys.argv) > 1 else LOCATION_KEY
+    latest = load_latest_snapshot(location_key)
+    if latest:
+        print(f"Latest fetch for {location_key}: {latest['fetched_at']}")
+        history = load_history(location_key, 0, int(time.time()))
+        print(f"Fetches kept: {len(history)}")
+    else:
+        print(f"No weather history for {location_key}")